@@ -0,0 +1,75 @@
+"""
+JWT authentication resolving the user of a token through a cache.
+
+The token carries the user id. Safe (read-only) requests take the user from
+the cache, kept USER_CACHE_TIMEOUT seconds and dropped whenever the user is
+saved or deleted (see account.signals); only a miss reads the database.
+Requests that write load the user from the database, so that a change is
+never made on behalf of a stale user, and refresh the cache.
+
+Only the fields authorization needs are cached, never the password hash or
+the e-mail address; the other fields of a cached user are deferred and read
+from the database if ever used.
+
+Rows changed with QuerySet.update() send no signal: they are seen by reads
+once the cached row expires. Invalidation only reaches other processes
+through a shared cache (see account.checks).
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+USER_KEY = 'account:user:%s'
+CACHED_FIELDS = ('id', 'user_name', 'is_active', 'is_staff', 'is_superuser')
+
+
+def get_cache():
+    return caches[settings.USER_CACHE_ALIAS]
+
+
+def invalidate(*pks):
+    """
+    Drops the cached rows of the given users
+    """
+    get_cache().delete_many([USER_KEY % pk for pk in pks])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication reading the user of safe requests from the cache
+    """
+
+    def authenticate(self, request):
+        # an authenticator is instantiated for every request
+        self.fresh = request.method not in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        key = USER_KEY % user_id
+        values = None if self.fresh else get_cache().get(key)
+        if values is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            values = {field: getattr(user, field) for field in CACHED_FIELDS}
+            get_cache().set(key, values, settings.USER_CACHE_TIMEOUT)
+        else:
+            # from_db() takes the values in the order of the model fields
+            fields = [field.attname for field in self.user_model._meta.concrete_fields if field.attname in values]
+            user = self.user_model.from_db(
+                self.user_model.objects.db, fields, [values[field] for field in fields]
+            )
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
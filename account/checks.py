@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_user_cache(app_configs, **kwargs):
+    """
+    Users are cached per process by a local memory cache: a deactivated
+    user keeps being let in by the other processes until the cached row
+    expires, and the signal dropping it only reaches the process that saved it
+    """
+    if not isinstance(caches[settings.USER_CACHE_ALIAS], LocMemCache) or not settings.USER_CACHE_TIMEOUT:
+        return []
+    return [Warning(
+        f'USER_CACHE_ALIAS ({settings.USER_CACHE_ALIAS!r}) is a local memory cache, '
+        'so changes to a user are not seen by the other processes for up to '
+        'USER_CACHE_TIMEOUT seconds.',
+        hint='Set CACHE_BACKEND and CACHE_LOCATION to a cache shared by all processes, '
+             'e.g. Redis, or USER_CACHE_TIMEOUT=0 not to cache users.',
+        id='account.W001',
+    )]
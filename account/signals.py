@@ -0,0 +1,17 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import authentication
+from .models import CustomUser
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def user_cache_invalidate(sender, instance, **kwargs):
+    """
+    Drops the cached row of a changed, deactivated or deleted user
+    once the change is committed
+    """
+    pk = instance.pk
+    transaction.on_commit(lambda: authentication.invalidate(pk))
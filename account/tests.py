@@ -1,3 +1,35 @@
-from django.test import TestCase
+import pytest
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
 
-# Create your tests here.
+from account.authentication import USER_KEY, CachedJWTAuthentication, get_cache
+from account.models import CustomUser
+
+
+@pytest.fixture
+def user(db):
+    return CustomUser.objects.create_user('reader@example.com', 'reader', 'secret', is_active=True)
+
+
+def authenticate(user, method='get'):
+    request = getattr(APIRequestFactory(), method)(
+        '/api/recipes/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}'
+    )
+    return CachedJWTAuthentication().authenticate(request)[0]
+
+
+def test_cached_user_leaves_out_credentials(user, django_assert_num_queries):
+    authenticate(user)
+
+    cached = get_cache().get(USER_KEY % user.pk)
+    assert user.password not in cached.values() and user.email not in cached.values()
+    with django_assert_num_queries(0):
+        reader = authenticate(user)
+        assert (reader.pk, reader.is_active, str(reader)) == (user.pk, True, 'reader')
+
+
+def test_writes_read_the_user_from_database(user, django_assert_num_queries):
+    authenticate(user)
+
+    with django_assert_num_queries(1):
+        assert authenticate(user, 'post').email == user.email
@@ -20,6 +20,14 @@ fi
 echo "Loading dump data"
 python manage.py loaddata ingredients_dump.json
 
-# Start server
+# Start server: gunicorn (gunicorn.conf.py) with SERVER=asgi or SERVER=wsgi,
+# the development server otherwise
 echo "Starting server"
-python manage.py runserver 0.0.0.0:8000
+case "$SERVER" in
+    asgi|wsgi)
+        exec gunicorn --config gunicorn.conf.py
+        ;;
+    *)
+        python manage.py runserver 0.0.0.0:8000
+        ;;
+esac
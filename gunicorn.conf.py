@@ -0,0 +1,36 @@
+"""
+Gunicorn settings of the production server, started by docker-entrypoint.sh
+with SERVER=asgi or SERVER=wsgi. Every value can be tuned from the
+environment.
+
+SERVER=asgi runs uvicorn workers: one event loop per process serving the
+async views (ASYNC_READ_VIEWS) and the comment streams, synchronous views
+running in threads started by asgiref, one per request in flight. Use it
+with the connection pool (DATABASE_POOL_SIZE) so that those threads share
+a bounded number of connections.
+
+SERVER=wsgi runs threaded synchronous workers, WEB_THREADS requests at
+a time each; comment streams are not served.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('WEB_BIND', '0.0.0.0:8000')
+
+if os.getenv('SERVER', 'asgi') == 'asgi':
+    wsgi_app = 'myproject.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'myproject.wsgi:application'
+    worker_class = 'gthread'
+
+workers = int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# requests at a time of a synchronous worker, uvicorn workers ignore it
+threads = int(os.getenv('WEB_THREADS', 4))
+# seconds a worker may not respond before it is restarted
+timeout = int(os.getenv('WEB_TIMEOUT', 30))
+# seconds an idle client connection is kept open
+keepalive = int(os.getenv('WEB_KEEPALIVE', 5))
+
+accesslog = os.getenv('WEB_ACCESS_LOG') or None
+errorlog = '-'
@@ -2,6 +2,8 @@
 ASGI config for myproject project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Comment streams are served by an ASGI application of their own, every
+other request by Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
@@ -9,8 +11,63 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "myproject.settings")
 
-application = get_asgi_application()
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    Django's ASGI handler reading streaming responses in a thread.
+
+    Django 4.1 iterates a streaming response on the event loop, where the
+    generators running queries (the recipe export) may not run. Every part
+    is read through sync_to_async instead, in the thread the view ran in.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            await super().send_response(response, send)
+            return
+
+        headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            headers.append((b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+
+        parts = iter(response)
+        read = sync_to_async(next, thread_sensitive=True)
+        done = object()
+        while (part := await read(parts, done)) is not done:
+            for chunk, _ in self.chunk_bytes(part):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+django.setup(set_prefix=False)
+django_application = StreamingASGIHandler()
+
+# imported once Django is set up
+from recipe_api import streams  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http':
+        match = streams.PATH.fullmatch(scope['path'])
+        if match:
+            await streams.comment_stream(scope, receive, send, int(match['pk']))
+            return
+    await django_application(scope, receive, send)
@@ -0,0 +1,220 @@
+"""
+PostgreSQL backend taking its connections from a pool shared by the threads
+of the process, instead of opening a new one for every request.
+
+Django still opens and closes a connection per request (CONN_MAX_AGE 0):
+opening takes an idle connection from the pool, closing gives it back. The
+pool holds at most OPTIONS['pool']['max_size'] connections; a thread finding
+all of them in use waits up to OPTIONS['pool']['timeout'] seconds for one,
+then fails with OperationalError. Waiting threads are served in the order
+they came, a returned connection is handed to the first of them. Waits are
+counted in `stats()`, and the slow ones logged.
+
+With CONN_HEALTH_CHECKS a connection taken from the pool is checked with a
+trivial query first, and replaced if the server has dropped it.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+import psycopg2.extras
+from django.db.backends.postgresql import base
+from psycopg2_pool import ThreadSafeConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# seconds of waiting for a connection logged as a warning
+SLOW_WAIT = 0.1
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class Pool(ThreadSafeConnectionPool):
+    """
+    Connection pool whose checkouts wait for a free connection,
+    keeping statistics of the waits
+    """
+
+    def __init__(self, max_size, timeout, **kwargs):
+        self.pid = os.getpid()
+        self.timeout = timeout
+        self.free = max_size
+        # locks the waiting threads block on, first come first served
+        self.waiters = deque()
+        self.stats_lock = threading.Lock()
+        self.in_use = self.opened = self.checkouts = self.waits = self.timeouts = 0
+        self.wait_time = self.max_wait_time = 0.0
+        super().__init__(minconn=0, maxconn=max_size, **kwargs)
+
+    def _connect(self, for_immediate_use=False):
+        connection = super()._connect(for_immediate_use)
+        with self.stats_lock:
+            self.opened += 1
+        return connection
+
+    def checkout(self, health_check):
+        started = time.monotonic()
+        self.acquire()
+        waited = time.monotonic() - started
+        with self.stats_lock:
+            self.checkouts += 1
+            self.wait_time += waited
+            self.max_wait_time = max(self.max_wait_time, waited)
+            # an uncontended semaphore is taken in microseconds
+            if waited >= 0.001:
+                self.waits += 1
+        if waited >= SLOW_WAIT:
+            logger.warning('Waited %.0fms for a database connection', waited * 1000)
+
+        try:
+            while True:
+                connection = self.getconn()
+                if not health_check or is_usable(connection):
+                    return connection
+                connection.close()
+                self.putconn(connection)
+        except BaseException:
+            self.release()
+            raise
+
+    def checkin(self, connection):
+        try:
+            self.putconn(connection)
+        finally:
+            self.release()
+
+    def acquire(self):
+        with self.stats_lock:
+            if self.free and not self.waiters:
+                self.free -= 1
+                self.in_use += 1
+                return
+            waiter = threading.Lock()
+            waiter.acquire()
+            self.waiters.append(waiter)
+
+        if waiter.acquire(timeout=self.timeout):
+            return
+        with self.stats_lock:
+            try:
+                self.waiters.remove(waiter)
+            except ValueError:
+                # a connection was handed over just now
+                return
+            self.timeouts += 1
+        raise psycopg2.OperationalError(
+            f'No database connection of the pool of {self.maxconn} '
+            f'was free within {self.timeout}s'
+        )
+
+    def release(self):
+        with self.stats_lock:
+            if self.waiters:
+                # handed over, still in use
+                self.waiters.popleft().release()
+            else:
+                self.free += 1
+                self.in_use -= 1
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                'size': self.maxconn,
+                'in_use': self.in_use,
+                'idle': len(self.idle_connections),
+                'opened': self.opened,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'wait_ms': round(self.wait_time * 1000, 3),
+                'max_wait_ms': round(self.max_wait_time * 1000, 3),
+            }
+
+
+def is_usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except psycopg2.Error:
+        return False
+    # the check must not leave a transaction open
+    if not connection.autocommit:
+        connection.rollback()
+    return True
+
+
+def get_pool(alias, settings_dict, conn_params):
+    """
+    Returns the pool of the database alias in this process; a process forked
+    from another one starts a pool of its own rather than sharing sockets
+    """
+    pool = _pools.get(alias)
+    if pool is None or pool.pid != os.getpid():
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None or pool.pid != os.getpid():
+                options = settings_dict['OPTIONS'].get('pool', {})
+                pool = _pools[alias] = Pool(
+                    max_size=options.get('max_size', 10),
+                    timeout=options.get('timeout', 10),
+                    idle_timeout=options.get('idle_timeout', 600),
+                    dsn=psycopg2.extensions.make_dsn(**conn_params),
+                )
+    return pool
+
+
+def stats(alias='default'):
+    """
+    Statistics of the pool of the database alias in this process,
+    None before its first connection
+    """
+    pool = _pools.get(alias)
+    if pool is None or pool.pid != os.getpid():
+        return None
+    return pool.stats()
+
+
+def clear(alias='default'):
+    """
+    Closes the idle connections of the pool of the database alias
+    """
+    pool = _pools.get(alias)
+    if pool is not None and pool.pid == os.getpid():
+        pool.clear()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    @base.async_unsafe
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(self.alias, self.settings_dict, conn_params)
+        connection = self.pool.checkout(self.settings_dict['CONN_HEALTH_CHECKS'])
+
+        # set up as the postgresql backend does once connected
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # a connection inherited from the parent process is left to it
+        if self.pool.pid != os.getpid():
+            return
+        with self.wrap_database_errors:
+            self.pool.checkin(self.connection)
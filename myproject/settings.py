@@ -29,9 +29,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.getenv('SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv('DEBUG', 'True') == 'True'
 
-ALLOWED_HOSTS = ['127.0.0.1']
+ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '127.0.0.1').split(',')
 
 
 # Application definition
@@ -46,7 +46,6 @@ INSTALLED_APPS = [
     "recipe_api.apps.RecipeApiConfig",
     "account.apps.AccountConfig",
     "rest_framework",
-    "debug_toolbar",
     "rest_framework_simplejwt.token_blacklist",
     "storages",
     "drf_yasg",
@@ -57,7 +56,6 @@ INTERNAL_IPS = [
 ]
 
 MIDDLEWARE = [
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -67,6 +65,12 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# The toolbar middleware is synchronous only, under ASGI it would put every
+# request, async views included, through a thread
+if DEBUG:
+    INSTALLED_APPS.append("debug_toolbar")
+    MIDDLEWARE.insert(0, "debug_toolbar.middleware.DebugToolbarMiddleware")
+
 ROOT_URLCONF = "myproject.urls"
 
 TEMPLATES = [
@@ -89,6 +93,10 @@ TIME_ZONE = 'UTC'
 
 WSGI_APPLICATION = "myproject.wsgi.application"
 
+# Serve the GET requests of the recipe list and detail and of the comment
+# list with async views (recipe_api.async_views); for ASGI servers
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'False') == 'True'
+
 
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
@@ -101,9 +109,64 @@ DATABASES = {
         'PASSWORD': os.getenv('DATABASE_PASS'),
         'HOST': os.getenv('DATABASE_HOST'),
         'PORT': '5432',
+        # seconds a thread keeps its connection for its next requests:
+        # 0 closes it after every request, None keeps it for good
+        'CONN_MAX_AGE': (
+            None if os.getenv('DATABASE_CONN_MAX_AGE') == 'None'
+            else int(os.getenv('DATABASE_CONN_MAX_AGE', 0))
+        ),
+        # a kept connection is checked before its first query of a request
+        'CONN_HEALTH_CHECKS': os.getenv('DATABASE_CONN_HEALTH_CHECKS', 'True') == 'True',
     }
 }
 
+# With DATABASE_POOL_SIZE set, the threads of a process share a pool of at
+# most that many connections (myproject.db_backends.pooled_postgresql).
+# Every request takes one for its duration and gives it back, waiting up to
+# DATABASE_POOL_TIMEOUT seconds when all of them are in use. Keep workers
+# times DATABASE_POOL_SIZE below the max_connections of the server.
+DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', 0))
+if DATABASE_POOL_SIZE:
+    DATABASES['default'].update({
+        'ENGINE': 'myproject.db_backends.pooled_postgresql',
+        # a connection kept by a thread would be lost to the pool
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {
+            'pool': {
+                'max_size': DATABASE_POOL_SIZE,
+                'timeout': float(os.getenv('DATABASE_POOL_TIMEOUT', 10)),
+                # seconds before an idle connection of the pool is closed
+                'idle_timeout': int(os.getenv('DATABASE_POOL_IDLE_TIMEOUT', 600)),
+            },
+        },
+    })
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Any Django cache backend can be plugged in through the environment,
+# e.g. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# and CACHE_LOCATION=redis://redis:6379. Local memory is used otherwise.
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        "LOCATION": os.getenv('CACHE_LOCATION', ''),
+    },
+}
+
+# cache alias and lifetime (seconds) of rendered recipe payloads. It also
+# holds the version of the ingredient catalogue, so it must be shared by all
+# processes in production (see recipe_api.checks)
+RECIPE_CACHE_ALIAS = 'default'
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 300))
+
+# cache alias and lifetime (seconds) of the users looked up by the
+# authentication of read-only requests. A local memory cache is per process:
+# a change to a user only drops it from the cache of the process that made
+# it, the others see it once their entry expires (see account.checks)
+USER_CACHE_ALIAS = 'default'
+USER_CACHE_TIMEOUT = int(os.getenv('USER_CACHE_TIMEOUT', 60))
+
 # Actual directory user files go to
 MEDIA_ROOT = os.path.join(BASE_DIR, 'mediafiles')
 
@@ -161,7 +224,7 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'account.authentication.CachedJWTAuthentication',
     ],
 
     'DEFAULT_PARSER_CLASSES': [
@@ -174,6 +237,11 @@ REST_FRAMEWORK = {
         'djangorestframework_camel_case.render.CamelCaseJSONRenderer',
         'djangorestframework_camel_case.render.CamelCaseBrowsableAPIRenderer',
     ],
+    # requests per user of the views with a throttle scope; counted in the
+    # default cache, so per process unless the cache is shared
+    'DEFAULT_THROTTLE_RATES': {
+        'export': os.getenv('EXPORT_THROTTLE_RATE', '10/hour'),
+    },
 }
 
 SIMPLE_JWT = {
@@ -193,8 +261,25 @@ AWS_REGION = os.getenv('AWS_REGION')
 AWS_LOCATION = os.getenv('TEMPORARY_FILES_DIRECTORY_NAME')
 AWS_PERMANENT_DIRECTORY = os.getenv('PERMANENT_FILES_DIRECTORY_NAME')
 AWS_QUERYSTRING_AUTH = False  # remove query parameter authentication from generated URLs
+# connections of the shared client, also the number of parallel copies
+# when images are promoted to the permanent directory
+AWS_S3_MAX_POOL_CONNECTIONS = int(os.getenv('AWS_S3_MAX_POOL_CONNECTIONS', 10))
 
 ALLOWED_UPLOAD_IMAGES = ('PNG', 'JPEG',)
+# uploads with more pixels are refused before they are decoded
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 40_000_000))
+# direct uploads to the storage: the max file size in bytes and the
+# lifetime of a presigned POST in seconds
+IMAGE_UPLOAD_MAX_SIZE = int(os.getenv('IMAGE_UPLOAD_MAX_SIZE', 20 * 1024 * 1024))
+IMAGE_UPLOAD_URL_EXPIRES = int(os.getenv('IMAGE_UPLOAD_URL_EXPIRES', 600))
+
+# With IMAGE_PROCESSING_ASYNC=True uploads are stored as they are and
+# converted by `manage.py process_images` workers, the upload endpoint
+# answers 202 and the image status can be polled
+IMAGE_PROCESSING_ASYNC = os.getenv('IMAGE_PROCESSING_ASYNC', 'False') == 'True'
+IMAGE_PROCESSING_MAX_ATTEMPTS = int(os.getenv('IMAGE_PROCESSING_MAX_ATTEMPTS', 3))
+# every uploaded image is also stored as WebP, next to the JPEG renditions
+IMAGE_RENDITIONS_WEBP = os.getenv('IMAGE_RENDITIONS_WEBP', 'True') == 'True'
 
 # Swagger
 SWAGGER_SETTINGS = {
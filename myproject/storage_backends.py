@@ -1,8 +1,38 @@
+import threading
+
+import boto3
+from botocore.config import Config
+from django.conf import settings
 from storages.backends.s3boto3 import S3Boto3Storage
 
 from myproject.settings import AWS_STORAGE_BUCKET_NAME
 
+_client = None
+_client_lock = threading.Lock()
+
 
 class ClientImageStorage(S3Boto3Storage):
     bucket_name = AWS_STORAGE_BUCKET_NAME
-    file_overwrite = False
\ No newline at end of file
+    file_overwrite = False
+
+
+def s3_client():
+    """
+    S3 client shared by the whole process. Clients are thread-safe, its
+    connection pool is sized for the threads copying or deleting objects;
+    creating one is not, hence the lock.
+    """
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = boto3.session.Session().client(
+                    's3',
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_REGION,
+                    endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+                    config=Config(max_pool_connections=settings.AWS_S3_MAX_POOL_CONNECTIONS),
+                )
+    return _client
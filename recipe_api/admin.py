@@ -2,6 +2,7 @@ from django.contrib import admin
 
 from .models import (Comment, Image, Ingredient, Recipe, RecipeIngredient,
                      RecipeStep)
+from .storage import image_url
 
 
 class CommentAdmin(admin.ModelAdmin):
@@ -17,10 +18,10 @@ class RecipeAdmin(admin.ModelAdmin):
         'time_created',
         'status',
     )
+    list_select_related = ('author', 'summary')
 
     def get_no_ingredients(self, obj):
-        no_ingredients = RecipeIngredient.objects.filter(recipe=obj.pk).count()
-        return no_ingredients
+        return obj.summary.ingredients_count
     get_no_ingredients.short_description = "No of ingredients"
 
 
@@ -33,10 +34,10 @@ class RecipeStepAdmin(admin.ModelAdmin):
 
 
 class ImageAdmin(admin.ModelAdmin):
-    list_display = ('id', 'image', 'get_image_url', 'is_temporary')
+    list_display = ('id', 'image', 'get_image_url', 'is_temporary', 'is_promoted')
 
     def get_image_url(self, obj):
-        return obj.image.url
+        return image_url(obj.image.name, obj.is_promoted)
     get_image_url.short_description = "URL from storage"
 
 
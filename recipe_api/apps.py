@@ -6,4 +6,4 @@ class RecipeApiConfig(AppConfig):
     name = "recipe_api"
 
     def ready(self):
-        from recipe_api import signals
+        from recipe_api import checks, signals  # noqa: F401
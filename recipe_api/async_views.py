@@ -0,0 +1,106 @@
+"""
+Asynchronous views for the hot read paths of the viewsets.
+
+DRF views are synchronous. A viewset with AsyncReadMixin names the actions
+it also implements as coroutines (`a<action>` methods, fetching rows with
+the async ORM) in `async_actions`, and AsyncReadRouter routes their GET
+requests to them, so that under an ASGI server the database waits of many
+requests overlap on the event loop of one process. Authentication,
+permissions and throttling are still DRF's synchronous code, run in a
+thread, and every other method or action is served by the synchronous view.
+"""
+from functools import update_wrapper
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.urls import URLPattern
+from rest_framework.routers import SimpleRouter
+
+
+class AsyncReadMixin:
+    """
+    Async dispatch of the `async_actions` of a viewset
+    """
+    # actions with an `a<action>` coroutine counterpart
+    async_actions = ()
+
+    @classmethod
+    def as_async_view(cls, actions=None, **initkwargs):
+        """
+        `as_view()` running the async actions as coroutines
+        """
+        view = cls.as_view(actions, **initkwargs)
+        sync_view = sync_to_async(view)
+        if 'get' in actions and 'head' not in actions:
+            actions['head'] = actions['get']
+
+        async def async_view(request, *args, **kwargs):
+            action = actions.get(request.method.lower())
+            if action not in cls.async_actions:
+                return await sync_view(request, *args, **kwargs)
+
+            # set up as the synchronous view does
+            self = cls(**initkwargs)
+            self.action_map = actions
+            self.request = request
+            return await self.async_dispatch(
+                getattr(self, f'a{action}'), request, *args, **kwargs
+            )
+
+        # name, docstring and the attributes routers, schema generators
+        # and the CSRF middleware look for (cls, actions, csrf_exempt...)
+        return update_wrapper(async_view, view)
+
+    async def async_dispatch(self, handler, request, *args, **kwargs):
+        """
+        `dispatch()` awaiting the handler
+        """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            # authentication may look the user up
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        # rendered by Django afterwards, in a thread
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def aget_object(self):
+        """
+        `get_object()` fetching the object with the async ORM
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+class AsyncReadRouter(SimpleRouter):
+    """
+    Router giving viewsets with async actions their async views
+    """
+
+    def get_urls(self):
+        return [
+            URLPattern(pattern.pattern, async_view(pattern.callback), pattern.default_args, pattern.name)
+            for pattern in super().get_urls()
+        ]
+
+
+def async_view(view):
+    async_actions = getattr(view.cls, 'async_actions', ())
+    if not any(action in async_actions for action in view.actions.values()):
+        return view
+    return view.cls.as_async_view(view.actions, **view.initkwargs)
@@ -0,0 +1,89 @@
+"""
+Read-through cache of rendered recipe payloads.
+
+Detail pages are stored per recipe id, list pages per request URL. List
+keys carry a version number, so a single increment drops every cached
+list page at once when any recipe changes.
+"""
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import caches
+
+DETAIL_KEY = 'recipe:detail:%s'
+LIST_KEY = 'recipe:list:%s:%s'
+LIST_VERSION_KEY = 'recipe:list:version'
+HITS_KEY = 'recipe:stats:hits'
+MISSES_KEY = 'recipe:stats:misses'
+
+
+def get_cache():
+    return caches[settings.RECIPE_CACHE_ALIAS]
+
+
+def _count(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        # the counter expired or has never been set
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def _lookup(key):
+    data = get_cache().get(key)
+    _count(MISSES_KEY if data is None else HITS_KEY)
+    return data
+
+
+def _list_version():
+    return get_cache().get_or_set(LIST_VERSION_KEY, 1, None)
+
+
+def _list_key(url):
+    return LIST_KEY % (_list_version(), md5(url.encode()).hexdigest())
+
+
+def get_detail(pk):
+    return _lookup(DETAIL_KEY % pk)
+
+
+def set_detail(pk, data):
+    get_cache().set(DETAIL_KEY % pk, data, settings.RECIPE_CACHE_TIMEOUT)
+
+
+def get_list(url):
+    return _lookup(_list_key(url))
+
+
+def set_list(url, data):
+    get_cache().set(_list_key(url), data, settings.RECIPE_CACHE_TIMEOUT)
+
+
+def invalidate_lists():
+    cache = get_cache()
+    try:
+        cache.incr(LIST_VERSION_KEY)
+    except ValueError:
+        cache.set(LIST_VERSION_KEY, 1, None)
+
+
+def invalidate(*pks):
+    """
+    Drops the cached detail pages of the given recipes and all list pages
+    """
+    get_cache().delete_many([DETAIL_KEY % pk for pk in pks])
+    invalidate_lists()
+
+
+def stats():
+    values = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    hits = values.get(HITS_KEY, 0)
+    misses = values.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else None,
+    }
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.caches, deploy=True)
+def check_recipe_cache(app_configs, **kwargs):
+    """
+    The version token of the ingredient catalogue (see recipe_api.ingredients)
+    and the cached recipe pages are dropped through RECIPE_CACHE_ALIAS, which
+    other processes only see when the cache is shared. With a local memory
+    cache, a process keeps resolving names to renamed or deleted ingredients.
+    """
+    if not isinstance(caches[settings.RECIPE_CACHE_ALIAS], LocMemCache):
+        return []
+    return [Error(
+        f'RECIPE_CACHE_ALIAS ({settings.RECIPE_CACHE_ALIAS!r}) is a local memory cache, '
+        'so changes to ingredients and recipes are not seen by the other processes.',
+        hint='Set CACHE_BACKEND and CACHE_LOCATION to a cache shared by all processes, e.g. Redis.',
+        id='recipe_api.E001',
+    )]
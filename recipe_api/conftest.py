@@ -0,0 +1,119 @@
+import pytest
+from django.core.cache import caches
+
+from account.models import CustomUser
+from recipe_api import promotion, storage_deletes
+from recipe_api.models import (Comment, Image, Ingredient, Recipe,
+                               RecipeIngredient, RecipeStep)
+
+INGREDIENTS_PER_RECIPE = 8
+STEPS_PER_RECIPE = 5
+COMMENTS_PER_RECIPE = 20
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """
+    Cached data of a test must not outlive its rolled back rows
+    """
+    for cache in caches.all():
+        cache.clear()
+
+
+@pytest.fixture
+def no_cache(settings):
+    """
+    Caches that never answer, so that the database path is measured
+    """
+    settings.CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    }
+    settings.RECIPE_CACHE_ALIAS = 'default'
+    settings.USER_CACHE_ALIAS = 'default'
+
+
+@pytest.fixture
+def local_storage(settings, tmp_path, monkeypatch):
+    """
+    Uploads go to a local directory instead of the cloud storage, and
+    promoted or deleted images have no files to copy or delete in it
+    """
+    settings.DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+    settings.MEDIA_ROOT = str(tmp_path)
+    monkeypatch.setattr(promotion, '_copy', lambda name: True)
+    monkeypatch.setattr(storage_deletes, 'delete_later', lambda keys: None)
+
+
+@pytest.fixture
+def author(db):
+    return CustomUser.objects.create(
+        email='author@example.com',
+        user_name='author',
+        is_active=True,
+    )
+
+
+@pytest.fixture
+def ingredients(db):
+    return Ingredient.objects.bulk_create([
+        Ingredient(name=f'Ingredient {index}') for index in range(INGREDIENTS_PER_RECIPE)
+    ])
+
+
+@pytest.fixture
+def make_recipes(author, ingredients):
+    """
+    Returns a function adding `count` published recipes with their
+    ingredients, steps and pictures, and comments on the last one
+    """
+    def make_recipes(count):
+        offset = Recipe.objects.count()
+        images = Image.objects.bulk_create([
+            Image(image=f'picture-{offset + index}.jpeg', is_temporary=False, is_promoted=True)
+            for index in range(count)
+        ])
+        recipes = Recipe.objects.bulk_create([
+            Recipe(
+                name=f'Recipe {offset + index}',
+                author=author,
+                category=Recipe.Category.values[index % len(Recipe.Category.values)],
+                is_vegetarian=index % 3 == 0,
+                is_spicy=index % 5 == 0,
+                time_cooking=10 + index % 50,
+                time_preparing=5 + index % 20,
+                servings_number=2,
+                status=Recipe.Status.PUBLISHED,
+                main_picture=image,
+            )
+            for index, image in enumerate(images)
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredient,
+                unit=RecipeIngredient.UnitOptions.GRAM,
+                amount=position + 1,
+            )
+            for recipe in recipes
+            for position, ingredient in enumerate(ingredients)
+        ])
+        RecipeStep.objects.bulk_create([
+            RecipeStep(recipe=recipe, text=f'Step {position} of {recipe.name}')
+            for recipe in recipes
+            for position in range(STEPS_PER_RECIPE)
+        ])
+        Comment.objects.bulk_create([
+            Comment(recipe=recipes[-1], user=author, text=f'Comment {index}')
+            for index in range(COMMENTS_PER_RECIPE)
+        ])
+        return recipes
+
+    return make_recipes
+
+
+@pytest.fixture
+def recipe(make_recipes):
+    """
+    A published recipe among a few others
+    """
+    return make_recipes(5)[-1]
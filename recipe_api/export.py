@@ -0,0 +1,66 @@
+import json
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from djangorestframework_camel_case.util import camelize
+
+from .models import Recipe, RecipeDeletion
+from .serializers import RecipeDetailedSerializer, RecipeExportSerializer
+
+# rows fetched from the server-side cursor (and prefetched for) at a time
+EXPORT_CHUNK_SIZE = 500
+
+# how far back before `since` an incremental export looks. time_updated is
+# the start time of the transaction that made the change, so a transaction
+# still open at the previous export commits rows stamped before its cutoff;
+# those changed within this margin are sent again rather than missed
+EXPORT_OVERLAP = timedelta(minutes=15)
+
+
+def export_queryset(since=None):
+    queryset = RecipeDetailedSerializer.setup_eager_loading(
+        Recipe.objects.filter(status=Recipe.Status.PUBLISHED)
+    )
+    if since is not None:
+        queryset = queryset.filter(time_updated__gt=since)
+    return queryset.order_by('time_updated', 'id')
+
+
+def iter_ndjson(since=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields published recipes as JSON lines, in the order they were changed.
+    Rows are read through a server-side cursor a chunk at a time and their
+    ingredients and steps are prefetched per chunk, so memory use does not
+    grow with the number of recipes.
+
+    An incremental export (`since` given) covers the changes since
+    EXPORT_OVERLAP before then, so a consumer must apply lines idempotently.
+    It ends with a {"id": ..., "deleted": true} line for every recipe
+    withdrawn from publication or deleted in that time.
+    """
+    if since is not None:
+        since -= EXPORT_OVERLAP
+
+    for recipe in export_queryset(since).iterator(chunk_size=chunk_size):
+        yield dump(RecipeExportSerializer(recipe).data)
+
+    if since is not None:
+        withdrawn = (Recipe.objects
+                     .filter(time_updated__gt=since)
+                     .exclude(status=Recipe.Status.PUBLISHED)
+                     .values_list('id', flat=True)
+                     )
+        for pk in withdrawn.iterator(chunk_size=chunk_size):
+            yield dump({'id': pk, 'deleted': True})
+
+        deleted = (RecipeDeletion.objects
+                   .filter(time_deleted__gt=since)
+                   .order_by('time_deleted', 'id')
+                   .values_list('recipe_id', flat=True)
+                   )
+        for pk in deleted.iterator(chunk_size=chunk_size):
+            yield dump({'id': pk, 'deleted': True})
+
+
+def dump(data):
+    return json.dumps(camelize(data), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
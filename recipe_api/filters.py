@@ -0,0 +1,134 @@
+from django.db.models import Count, F, Q
+
+from .models import Recipe
+from .serializers import RecipeFilterSerializer
+
+# buckets of total time (cooking + preparing) in minutes, upper bound excluded
+TIME_RANGES = (
+    ('0-30', None, 30),
+    ('30-60', 30, 60),
+    ('60-120', 60, 120),
+    ('120+', 120, None),
+)
+
+BOOLEAN_VALUES = (('true', True), ('false', False))
+
+
+class RecipeFilter:
+    """
+    Filters the list of recipes by category, spiciness, vegetarianism and
+    total time, and counts how many recipes every filter value would give.
+    """
+
+    def __init__(self, query_params):
+        params = {
+            key: query_params.get(key)
+            for key in ('is_spicy', 'is_vegetarian', 'time_min', 'time_max', 'facets')
+            if key in query_params
+        }
+        categories = [
+            value.strip()
+            for param in query_params.getlist('category')
+            for value in param.split(',')
+            if value.strip()
+        ]
+        if categories:
+            params['category'] = categories
+
+        serializer = RecipeFilterSerializer(data=params)
+        serializer.is_valid(raise_exception=True)
+        self.params = serializer.validated_data
+
+    @property
+    def with_facets(self):
+        return self.params['facets']
+
+    def conditions(self):
+        """
+        Returns the filter condition of every filtered facet
+        """
+        conditions = {}
+        if 'category' in self.params:
+            conditions['category'] = Q(category__in=self.params['category'])
+        for field in ('is_spicy', 'is_vegetarian'):
+            if field in self.params:
+                conditions[field] = Q(**{field: self.params[field]})
+        if 'time_min' in self.params or 'time_max' in self.params:
+            conditions['total_time'] = time_range(
+                self.params.get('time_min'),
+                self.params.get('time_max'),
+                include_max=True,
+            )
+        return conditions
+
+    def filter(self, queryset):
+        queryset = queryset.annotate(total_time=F('time_cooking') + F('time_preparing'))
+        for condition in self.conditions().values():
+            queryset = queryset.filter(condition)
+        return queryset
+
+    def facets(self, queryset):
+        """
+        Counts recipes for every facet value in one aggregate query.
+        A facet is counted with the filters of the other facets applied
+        but not its own, so selecting a value does not zero its siblings.
+        """
+        values, aggregates = self.facet_aggregates()
+        counts = (queryset
+                  .annotate(total_time=F('time_cooking') + F('time_preparing'))
+                  .aggregate(**aggregates)
+                  )
+        return facet_counts(values, counts)
+
+    async def afacets(self, queryset):
+        """
+        `facets()` counting with the async ORM
+        """
+        values, aggregates = self.facet_aggregates()
+        counts = await (queryset
+                        .annotate(total_time=F('time_cooking') + F('time_preparing'))
+                        .aaggregate(**aggregates)
+                        )
+        return facet_counts(values, counts)
+
+    def facet_aggregates(self):
+        """
+        Returns the values of every facet with their conditions,
+        and the aggregates counting them
+        """
+        conditions = self.conditions()
+        values = {
+            'category': [(value, Q(category=value)) for value in Recipe.Category.values],
+            'is_spicy': [(name, Q(is_spicy=value)) for name, value in BOOLEAN_VALUES],
+            'is_vegetarian': [(name, Q(is_vegetarian=value)) for name, value in BOOLEAN_VALUES],
+            'total_time': [(name, time_range(low, high)) for name, low, high in TIME_RANGES],
+        }
+
+        aggregates = {}
+        for facet, facet_values in values.items():
+            others = Q()
+            for other, condition in conditions.items():
+                if other != facet:
+                    others &= condition
+            for index, (_, condition) in enumerate(facet_values):
+                aggregates[f'{facet}_{index}'] = Count('id', filter=others & condition)
+        return values, aggregates
+
+
+def facet_counts(values, counts):
+    return {
+        facet: {
+            name: counts[f'{facet}_{index}']
+            for index, (name, _) in enumerate(facet_values)
+        }
+        for facet, facet_values in values.items()
+    }
+
+
+def time_range(low, high, include_max=False):
+    condition = Q()
+    if low is not None:
+        condition &= Q(total_time__gte=low)
+    if high is not None:
+        condition &= Q(total_time__lte=high) if include_max else Q(total_time__lt=high)
+    return condition
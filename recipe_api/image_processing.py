@@ -0,0 +1,135 @@
+"""
+Database-backed queue of uploaded images waiting for conversion.
+
+Pending images are the queue itself: a worker claims a batch of them with
+SELECT ... FOR UPDATE SKIP LOCKED, so several workers never take the same
+image, converts them in a process pool and stores the results. A failed
+image is retried after RETRY_DELAY until IMAGE_PROCESSING_MAX_ATTEMPTS is
+reached; an image whose worker died while processing it is queued again
+after a timeout.
+"""
+from datetime import timedelta
+from io import BytesIO
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from utils.image_converter import InvalidImage, RenditionConverter
+
+from . import cache as recipe_cache
+from .models import Image
+from .promotion import showing
+
+RETRY_DELAY = timedelta(seconds=30)
+
+
+def claim(batch_size):
+    """
+    Marks up to `batch_size` pending images as being processed and returns them
+    """
+    with transaction.atomic():
+        images = list(
+            Image.objects
+            .filter(status=Image.Status.PENDING)
+            .filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=timezone.now() - RETRY_DELAY))
+            .order_by('id')
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        if images:
+            Image.objects.filter(pk__in=[image.pk for image in images]).update(
+                status=Image.Status.PROCESSING,
+                attempts=F('attempts') + 1,
+                claimed_at=timezone.now(),
+            )
+    return images
+
+
+def convert(content, webp):
+    """
+    Converts raw image content into renditions, runs in a worker process.
+    Direct uploads have not been checked yet, their format and size are.
+    """
+    try:
+        img = RenditionConverter.open(
+            BytesIO(content),
+            settings.ALLOWED_UPLOAD_IMAGES,
+            settings.IMAGE_MAX_PIXELS,
+        )
+    except InvalidImage as error:
+        raise ValueError(f'Not an accepted image ({error.reason}).')
+    return RenditionConverter.convert(img, webp)
+
+
+def store(renditions):
+    """
+    Saves the files of all renditions under a common new name. Returns the
+    name of the main file, for the image field, and the record of the
+    renditions, for Image.renditions.
+    """
+    storage = Image._meta.get_field('image').storage
+    stem = uuid4()
+    record = {}
+    for name, rendition in renditions.items():
+        record[name] = {'width': rendition['width'], 'height': rendition['height']}
+        for format, content in rendition['files'].items():
+            record[name][format] = storage.save(f'{stem}_{name}.{format}', ContentFile(content))
+    return record[RenditionConverter.MAIN]['jpeg'], record
+
+
+def read(image):
+    with image.image.open('rb') as file:
+        return file.read()
+
+
+def complete(image, renditions):
+    """
+    Stores the renditions in place of the raw upload. Recipes saved with the
+    image while it was processed are dropped from the cache, which still
+    shows it unprocessed.
+    """
+    raw_name = image.image.name
+    main, record = store(renditions)
+    Image.objects.filter(pk=image.pk).update(
+        image=main,
+        renditions=record,
+        status=Image.Status.READY,
+        error='',
+    )
+    recipes = showing([image.pk])
+    if recipes:
+        recipe_cache.invalidate(*recipes)
+    image.image.storage.delete(raw_name)
+
+
+def fail(image, error):
+    """
+    Queues the image again, or gives up after the last attempt
+    """
+    attempts = Image.objects.values_list('attempts', flat=True).get(pk=image.pk)
+    retry = attempts < settings.IMAGE_PROCESSING_MAX_ATTEMPTS
+    Image.objects.filter(pk=image.pk).update(
+        status=Image.Status.PENDING if retry else Image.Status.FAILED,
+        error=str(error)[:1000],
+    )
+    return retry
+
+
+def requeue_stale(timeout):
+    """
+    Queues again the images claimed by workers that did not finish in time.
+    Images that have used up their attempts (e.g. by crashing every
+    worker that took them) are marked as failed.
+    """
+    stale = Image.objects.filter(
+        status=Image.Status.PROCESSING,
+        claimed_at__lt=timezone.now() - timedelta(seconds=timeout),
+    )
+    stale.filter(attempts__gte=settings.IMAGE_PROCESSING_MAX_ATTEMPTS).update(
+        status=Image.Status.FAILED,
+        error='Processing did not finish in time.',
+    )
+    return stale.update(status=Image.Status.PENDING)
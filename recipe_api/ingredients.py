@@ -0,0 +1,67 @@
+"""
+In-process cache of the ingredient catalogue, mapping names to ids.
+
+The catalogue is loaded from a fixture and barely changes, so every process
+keeps the whole of it in memory. A version token in the shared cache is
+replaced whenever an ingredient changes; a process holding another version
+reloads the catalogue on its next lookup. A token evicted from the cache
+is replaced as well, so eviction can only cause a reload, never staleness.
+The token must be in a cache shared by all processes (recipe_api.E001).
+
+The catalogue is only ever changed under _lock, readers take the dict
+as it is.
+"""
+import threading
+from uuid import uuid4
+
+from . import cache as recipe_cache
+from .models import Ingredient
+
+VERSION_KEY = 'ingredient:names:version'
+
+_lock = threading.Lock()
+_version = None
+_ids = {}
+
+
+def _current_version():
+    return recipe_cache.get_cache().get_or_set(VERSION_KEY, _new_version, None)
+
+
+def _new_version():
+    return uuid4().hex
+
+
+def _catalogue():
+    global _ids, _version
+
+    version = _current_version()
+    if version != _version:
+        with _lock:
+            if version != _version:
+                _ids = dict(Ingredient.objects.values_list('name', 'id'))
+                _version = version
+    return _ids
+
+
+def resolve(names):
+    """
+    Returns {name: id} for the given names, leaving out unknown ones.
+    Names missing from the catalogue (e.g. added by another process
+    just now) are looked up with a single query.
+    """
+    ids = _catalogue()
+    found = {name: ids[name] for name in names if name in ids}
+    missing = set(names) - found.keys()
+    if missing:
+        fetched = dict(
+            Ingredient.objects.filter(name__in=missing).values_list('name', 'id')
+        )
+        with _lock:
+            _ids.update(fetched)
+        found.update(fetched)
+    return found
+
+
+def invalidate():
+    recipe_cache.get_cache().set(VERSION_KEY, _new_version(), None)
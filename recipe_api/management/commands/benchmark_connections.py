@@ -0,0 +1,209 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from account.models import CustomUser
+from myproject.db_backends.pooled_postgresql import base as pooled
+from recipe_api.models import Comment, Recipe
+
+POOLED_ENGINE = 'myproject.db_backends.pooled_postgresql'
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks how the way database connections are handled changes "
+        "request latency. Requests for the comments of a recipe go through "
+        "the whole WSGI handler, so the connection is handled as under a "
+        "server, with a new connection per request, persistent connections "
+        "(CONN_MAX_AGE) and a shared pool, at several concurrencies, "
+        "against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=300,
+            help='Requests timed per mode and concurrency.',
+        )
+        parser.add_argument(
+            '--concurrency',
+            default='1,8',
+            help='Comma separated numbers of threads sending requests.',
+        )
+        parser.add_argument(
+            '--pool-size',
+            type=int,
+            default=4,
+            help='Connections of the pool in the pooled mode.',
+        )
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help='Keep the test database between runs.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            concurrencies = sorted({int(value) for value in options['concurrency'].split(',')})
+        except ValueError:
+            raise CommandError('--concurrency must be a comma separated list of numbers.')
+        if not concurrencies or concurrencies[0] < 1 or options['requests'] < 1 \
+                or options['pool_size'] < 1:
+            raise CommandError('--requests, --concurrency and --pool-size must be positive.')
+
+        modes = {
+            'new': {'CONN_MAX_AGE': 0},
+            'persistent': {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True},
+            'pooled': {
+                'ENGINE': POOLED_ENGINE,
+                'CONN_MAX_AGE': 0,
+                'CONN_HEALTH_CHECKS': True,
+                'OPTIONS': {'pool': {'max_size': options['pool_size']}},
+            },
+        }
+
+        old_name = connection.creation.create_test_db(
+            verbosity=0,
+            autoclobber=True,
+            keepdb=options['keepdb'],
+        )
+        original = dict(connections.settings['default'])
+        try:
+            path = self.prepare()
+            # as in production: no debug toolbar nor query log, and no cache
+            # answering without touching the database
+            with override_settings(DEBUG=False, CACHES={
+                **settings.CACHES,
+                'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+            }):
+                for mode, changes in modes.items():
+                    for concurrency in concurrencies:
+                        self.use(original, changes)
+                        self.report(mode, concurrency, self.run(
+                            path, options['requests'], concurrency, mode == 'pooled'
+                        ))
+        finally:
+            self.use(original, {})
+            pooled.clear()
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+    def prepare(self):
+        """
+        Returns the path of a small page of comments
+        """
+        author, _ = CustomUser.objects.get_or_create(
+            email='benchmark@example.com',
+            defaults={'user_name': 'benchmark', 'is_active': True},
+        )
+        recipe = Recipe.objects.filter(author=author).first() or Recipe.objects.create(
+            name='Benchmark recipe',
+            author=author,
+            category=Recipe.Category.SOUP,
+            time_cooking=30,
+            time_preparing=15,
+            servings_number=2,
+            status=Recipe.Status.PUBLISHED,
+        )
+        if not recipe.comment_set.exists():
+            Comment.objects.bulk_create([
+                Comment(recipe=recipe, user=author, text=f'Comment {index}')
+                for index in range(20)
+            ])
+        return f'/api/recipes/{recipe.pk}/feedbacks/?limit=10'
+
+    @staticmethod
+    def use(original, changes):
+        """
+        Makes the connections opened from now on follow the given settings
+        """
+        connections.close_all()
+        connections.settings['default'].clear()
+        connections.settings['default'].update({**original, **changes})
+        # the wrapper of this thread is built again from the settings
+        del connections['default']
+
+    def run(self, path, requests, concurrency, pool):
+        handler = WSGIHandler()
+        # requests are built for a host the project actually serves
+        host = next(
+            (host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'),
+            'localhost',
+        )
+        factory = RequestFactory(SERVER_NAME=host, HTTP_ACCEPT='application/json')
+        opened = []
+        counter_lock = threading.Lock()
+
+        def count(sender, **kwargs):
+            with counter_lock:
+                opened.append(1)
+
+        def call():
+            started = time.perf_counter()
+            response = handler(factory.get(path).environ, lambda status, headers: None)
+            content = b''.join(response)
+            # as a server does; ends the request and handles its connection
+            response.close()
+            if response.status_code >= 400:
+                raise CommandError(f'{path} responded {response.status_code}: {content[:500]}')
+            return (time.perf_counter() - started) * 1000
+
+        def client(count):
+            try:
+                return [call() for _ in range(count)]
+            finally:
+                connections.close_all()
+
+        # warm up the code paths, not the connections
+        client(1)
+        pool_before = pooled.stats() or {}
+        connection_created.connect(count)
+        try:
+            shares = [requests // concurrency + (index < requests % concurrency)
+                      for index in range(concurrency)]
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                timings = [timing for result in executor.map(client, shares) for timing in result]
+            elapsed = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(count)
+
+        percentiles = statistics.quantiles(timings, n=100, method='inclusive')
+        result = {
+            'p50_ms': statistics.median(timings),
+            'p95_ms': percentiles[94],
+            'p99_ms': percentiles[98],
+            'rps': len(timings) / elapsed,
+            'connections': len(opened),
+        }
+        if pool:
+            pool_after = pooled.stats()
+            checkouts = pool_after['checkouts'] - pool_before.get('checkouts', 0)
+            # connections taken from the pool are no new connections
+            result['connections'] = pool_after['opened'] - pool_before.get('opened', 0)
+            result['pool_wait_ms'] = (
+                (pool_after['wait_ms'] - pool_before.get('wait_ms', 0)) / checkouts
+                if checkouts else 0
+            )
+            result['pool_waits'] = pool_after['waits'] - pool_before.get('waits', 0)
+        return result
+
+    def report(self, mode, concurrency, result):
+        line = (
+            f"  {mode:<10} x{concurrency:<3} p50 {result['p50_ms']:>7.2f}ms  "
+            f"p95 {result['p95_ms']:>7.2f}ms  p99 {result['p99_ms']:>7.2f}ms  "
+            f"{result['rps']:>7.0f} req/s  {result['connections']:>4} connections opened"
+        )
+        if 'pool_wait_ms' in result:
+            line += (f"  {result['pool_waits']} waited for the pool, "
+                     f"{result['pool_wait_ms']:.2f}ms per request")
+        self.stdout.write(line)
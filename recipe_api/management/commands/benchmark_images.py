@@ -0,0 +1,137 @@
+import multiprocessing
+import resource
+import statistics
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image as PillowImage
+
+from utils.image_converter import RenditionConverter
+
+SIZES = {
+    '4K': (3840, 2160),
+    '12MP': (4000, 3000),
+}
+FORMATS = ('JPEG', 'PNG')
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the upload image pipeline (header validation and "
+        "conversion to all renditions) on generated 4K and 12 MP photos. "
+        "Every run happens in a fresh process, so that its peak resident "
+        "memory can be measured. The pipeline is compared with and without "
+        "the draft/reduce shortcuts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Runs per input and mode.',
+        )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be positive.')
+
+        context = multiprocessing.get_context('fork')
+        for size_name, size in SIZES.items():
+            for format in FORMATS:
+                # generated in a child too, so that no process is forked with
+                # image memory Pillow could reuse
+                with context.Pool(1) as pool:
+                    content = pool.apply(photo, (size, format))
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f'{size_name} {format} ({len(content) / 2 ** 20:.1f} MiB)'
+                ))
+                for fast in (False, True):
+                    runs = []
+                    for _ in range(options['repeat']):
+                        # one process per run, its peak memory is its own
+                        with context.Pool(1, maxtasksperchild=1) as pool:
+                            runs.append(pool.apply(run, (content, fast)))
+
+                    timings = [seconds * 1000 for seconds, _, _ in runs]
+                    peak = max(peak for _, peak, _ in runs)
+                    output = runs[0][2]
+                    self.stdout.write(
+                        f"  {'draft/reduce' if fast else 'full decode':<13} "
+                        f"median {statistics.median(timings):>7.1f}ms  "
+                        f"max {max(timings):>7.1f}ms  "
+                        f"peak +{peak / 1024:>6.1f} MiB  "
+                        f"output {output / 1024:>6.1f} KiB"
+                    )
+
+
+def run(content, fast):
+    """
+    Validates and converts the image like an upload; returns the time taken,
+    the growth of peak resident memory (KiB) and the size of all renditions
+    """
+    baseline = reset_peak_memory()
+    started = time.perf_counter()
+    img = RenditionConverter.open(
+        BytesIO(content),
+        settings.ALLOWED_UPLOAD_IMAGES,
+        settings.IMAGE_MAX_PIXELS,
+    )
+    renditions = RenditionConverter.convert(img, webp=settings.IMAGE_RENDITIONS_WEBP, fast=fast)
+    elapsed = time.perf_counter() - started
+    peak = peak_memory() - baseline
+    output = sum(
+        len(file)
+        for rendition in renditions.values()
+        for file in rendition['files'].values()
+    )
+    return elapsed, peak, output
+
+
+def reset_peak_memory():
+    """
+    Resets the peak resident memory of the process to the current one, which
+    is returned. A forked process starts with the peak of its parent;
+    only Linux allows resetting it, elsewhere that peak is measured from.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+    except OSError:
+        pass
+    return peak_memory()
+
+
+def peak_memory():
+    """
+    Returns the peak resident memory of the process in KiB
+    """
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def photo(size, format):
+    """
+    Returns a generated picture with smooth areas and grain, compressing
+    about like a photo does
+    """
+    width, height = size
+    small = (width // 32, height // 32)
+    base = PillowImage.merge('RGB', [
+        PillowImage.effect_noise(small, 100).point(lambda value, shift=shift: (value + shift) % 256)
+        for shift in (0, 85, 170)
+    ]).resize(size, PillowImage.BICUBIC)
+    grain = PillowImage.effect_noise(size, 12).convert('RGB')
+    img = PillowImage.blend(base, grain, 0.15)
+
+    content = BytesIO()
+    img.save(content, format=format, quality=90)
+    return content.getvalue()
@@ -0,0 +1,51 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from recipe_api.export import EXPORT_CHUNK_SIZE, iter_ndjson
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes all published recipes as NDJSON, one recipe per line. "
+        "With --since only recipes changed after the given timestamp are "
+        "written, followed by deletion markers for withdrawn ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='ISO 8601 timestamp of the previous export.',
+        )
+        parser.add_argument(
+            '--output',
+            help='File to write to, stdout by default.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=EXPORT_CHUNK_SIZE,
+            help='Rows fetched from the database at a time.',
+        )
+
+    def handle(self, *args, **options):
+        since = options['since']
+        if since is not None:
+            since = parse_datetime(since)
+            if since is None:
+                raise CommandError('--since must be an ISO 8601 timestamp.')
+
+        output = open(options['output'], 'w', encoding='utf-8') if options['output'] else sys.stdout
+        started = time.monotonic()
+        lines = 0
+        try:
+            for line in iter_ndjson(since, options['chunk_size']):
+                output.write(line)
+                lines += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        self.stderr.write(f'Exported {lines} lines in {time.monotonic() - started:.1f}s')
@@ -0,0 +1,332 @@
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from djangorestframework_camel_case.util import underscoreize
+
+from account.models import CustomUser
+from recipe_api import cache as recipe_cache
+from recipe_api import ingredients as ingredient_catalogue
+from recipe_api import promotion
+from recipe_api.models import (Image, Ingredient, Recipe, RecipeIngredient,
+                               RecipeStep)
+from recipe_api.storage import file_name
+
+RECIPE_FIELDS = (
+    'name',
+    'category',
+    'time_cooking',
+    'time_preparing',
+    'servings_number',
+)
+
+NAME_MAX_LENGTH = Recipe._meta.get_field('name').max_length
+STEP_TEXT_MAX_LENGTH = RecipeStep._meta.get_field('text').max_length
+INGREDIENT_NAME_MAX_LENGTH = Ingredient._meta.get_field('name').max_length
+# largest value of a PositiveIntegerField in PostgreSQL
+MAX_INTEGER = 2147483647
+
+
+class RecordError(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports recipes from a JSON Lines file, one recipe per line, in the "
+        "shape the API accepts plus an 'author' (user name). The file is "
+        "streamed and written in batches, each in its own transaction. The "
+        "number of imported lines is kept in a checkpoint file, so a failed "
+        "import resumes after the last committed batch when run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the .jsonl file.')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of recipes written per transaction.',
+        )
+        parser.add_argument(
+            '--author',
+            help='User name of the author of recipes that do not name one.',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Checkpoint file, "<path>.checkpoint" by default.',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore the checkpoint and import from the first line.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        batch_size = options['batch_size']
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive.')
+        if not os.path.exists(path):
+            raise CommandError(f'File {path} does not exist.')
+
+        skip = 0 if options['restart'] else read_checkpoint(checkpoint)
+        if skip:
+            self.stdout.write(f'Resuming after line {skip}')
+
+        self.default_author = options['author']
+        self.units = set(RecipeIngredient.UnitOptions.values)
+        self.categories = set(Recipe.Category.values)
+        self.statuses = set(Recipe.Status.values)
+
+        imported = rejected = 0
+        line_number = skip
+        started = time.monotonic()
+
+        with open(path, encoding='utf-8') as lines:
+            lines = islice(lines, skip, None)
+            while True:
+                batch = list(islice(lines, batch_size))
+                if not batch:
+                    break
+
+                batch_started = time.monotonic()
+                records = []
+                for offset, line in enumerate(batch, start=line_number + 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        records.append((offset, self.parse(line)))
+                    except RecordError as error:
+                        rejected += 1
+                        self.stderr.write(f'Line {offset}: {error}')
+
+                created, errors = self.import_batch(records)
+                for offset, error in errors:
+                    self.stderr.write(f'Line {offset}: {error}')
+
+                imported += created
+                rejected += len(errors)
+                line_number += len(batch)
+                write_checkpoint(checkpoint, line_number)
+
+                elapsed = time.monotonic() - batch_started
+                self.stdout.write(
+                    f'Line {line_number}: {created} recipes in {elapsed:.2f}s '
+                    f'({created / elapsed if elapsed else 0:.0f}/s)'
+                )
+
+        recipe_cache.invalidate_lists()
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} recipes, rejected {rejected} in {elapsed:.1f}s '
+            f'({imported / elapsed if elapsed else 0:.0f} recipes/s)'
+        ))
+
+    def parse(self, line):
+        """
+        Decodes and checks one record without touching the database
+        """
+        try:
+            record = underscoreize(json.loads(line))
+        except ValueError:
+            raise RecordError('Invalid JSON.')
+        if not isinstance(record, dict):
+            raise RecordError('A record must be an object.')
+
+        missing = [field for field in RECIPE_FIELDS + ('main_picture', ) if not record.get(field)]
+        if missing:
+            raise RecordError(f"Missing fields: {', '.join(missing)}")
+        for field in ('name', 'category', 'main_picture'):
+            if not isinstance(record[field], str):
+                raise RecordError(f'{field} must be a string.')
+        if len(record['name']) > NAME_MAX_LENGTH:
+            raise RecordError(f'name must be at most {NAME_MAX_LENGTH} characters long.')
+
+        author = record.get('author', self.default_author)
+        if not author:
+            raise RecordError('Missing author.')
+        if not isinstance(author, str):
+            raise RecordError('author must be a user name.')
+        if record['category'] not in self.categories:
+            raise RecordError(f"Unknown category '{record['category']}'.")
+        status = record.get('status', Recipe.Status.PUBLISHED)
+        if not isinstance(status, str) or status not in self.statuses:
+            raise RecordError(f"Unknown status '{status}'.")
+        for field in ('time_cooking', 'time_preparing', 'servings_number'):
+            value = record[field]
+            if isinstance(value, bool) or not isinstance(value, int) or not 1 <= value <= MAX_INTEGER:
+                raise RecordError(f'{field} must be a positive integer.')
+        for field in ('is_spicy', 'is_vegetarian'):
+            if not isinstance(record.get(field, False), bool):
+                raise RecordError(f'{field} must be true or false.')
+
+        ingredients = record.get('ingredients') or []
+        steps = record.get('steps') or []
+        if not ingredients:
+            raise RecordError('Recipe must have at least one ingredient')
+        if not steps:
+            raise RecordError('Recipe must have at least one step')
+        if not isinstance(ingredients, list) or not all(isinstance(item, dict) for item in ingredients):
+            raise RecordError('ingredients must be a list of objects.')
+        if not isinstance(steps, list) or not all(isinstance(item, dict) for item in steps):
+            raise RecordError('steps must be a list of objects.')
+
+        for step in steps:
+            if not isinstance(step.get('text'), str) or not step['text'].strip():
+                raise RecordError('Every step must have a text.')
+            if len(step['text']) > STEP_TEXT_MAX_LENGTH:
+                raise RecordError(f'Step texts must be at most {STEP_TEXT_MAX_LENGTH} characters long.')
+            if not isinstance(step.get('image') or '', str):
+                raise RecordError('A step image must be a URL.')
+
+        for ingredient in ingredients:
+            name = ingredient.get('ingredient')
+            if not name or not isinstance(name, str):
+                raise RecordError('Every ingredient must have a name.')
+            if len(name) > INGREDIENT_NAME_MAX_LENGTH:
+                raise RecordError(
+                    f'Ingredient names must be at most {INGREDIENT_NAME_MAX_LENGTH} characters long.'
+                )
+            unit = ingredient.get('unit')
+            if not isinstance(unit, str) or unit not in self.units:
+                raise RecordError(f"Unknown unit '{unit}'.")
+            amount = ingredient.get('amount')
+            try:
+                if isinstance(amount, bool) or not isinstance(amount, (int, float, str)):
+                    raise InvalidOperation
+                amount = Decimal(str(amount))
+                # amounts are stored with 5 digits, 2 of them decimal
+                if not amount.is_finite() or not Decimal('0.01') <= amount < 1000:
+                    raise InvalidOperation
+            except InvalidOperation:
+                raise RecordError('Invalid ingredient amount.')
+            ingredient['amount'] = amount
+
+        for url in [record['main_picture']] + [step['image'] for step in steps if step.get('image')]:
+            if file_name(url) is None:
+                raise RecordError(f'Invalid URL {url}.')
+
+        return record
+
+    def import_batch(self, records):
+        """
+        Resolves the references of a batch with one query per kind
+        and writes it in one transaction
+        """
+        authors = {record.get('author', self.default_author) for _, record in records}
+        names = {
+            ingredient['ingredient']
+            for _, record in records for ingredient in record['ingredients']
+        }
+        filenames = {
+            url.split('/')[-1]
+            for _, record in records
+            for url in [record['main_picture']] + [step.get('image') for step in record['steps']]
+            if url
+        }
+
+        author_ids = dict(
+            CustomUser.objects.filter(user_name__in=authors).values_list('user_name', 'id')
+        )
+        ingredient_ids = ingredient_catalogue.resolve(names)
+        images = {
+            image.image.name: image
+            for image in Image.objects.filter(image__in=filenames).only('id', 'image', 'is_promoted')
+        }
+
+        def image(url):
+            return images[url.split('/')[-1]] if url else None
+
+        def image_id(url):
+            return image(url).pk if url else None
+
+        errors = []
+        recipes, parts = [], []
+        for offset, record in records:
+            author = record.get('author', self.default_author)
+            urls = [record['main_picture']] + [step.get('image') for step in record['steps']]
+
+            unknown = []
+            if author not in author_ids:
+                unknown.append(f"author '{author}'")
+            unknown += [
+                f"ingredient '{ingredient['ingredient']}'"
+                for ingredient in record['ingredients']
+                if ingredient['ingredient'] not in ingredient_ids
+            ]
+            unknown += [
+                f'image {url}'
+                for url in urls
+                if url and url.split('/')[-1] not in images
+            ]
+            if unknown:
+                errors.append((offset, f"Unknown {', '.join(unknown)}."))
+                continue
+
+            recipes.append(Recipe(
+                author_id=author_ids[author],
+                main_picture_id=image_id(record['main_picture']),
+                is_spicy=record.get('is_spicy', False),
+                is_vegetarian=record.get('is_vegetarian', False),
+                status=record.get('status', Recipe.Status.PUBLISHED),
+                **{field: record[field] for field in RECIPE_FIELDS},
+            ))
+            parts.append(record)
+
+        with transaction.atomic():
+            Recipe.objects.bulk_create(recipes)
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(
+                    recipe_id=recipe.pk,
+                    ingredient_id=ingredient_ids[ingredient['ingredient']],
+                    unit=ingredient['unit'],
+                    amount=ingredient['amount'],
+                )
+                for recipe, record in zip(recipes, parts)
+                for ingredient in record['ingredients']
+            ])
+            RecipeStep.objects.bulk_create([
+                RecipeStep(
+                    recipe_id=recipe.pk,
+                    text=step['text'],
+                    image_id=image_id(step.get('image')),
+                )
+                for recipe, record in zip(recipes, parts)
+                for step in record['steps']
+            ])
+            # promoted once the batch commits, as pictures of recipes saved through the API
+            promotion.keep([
+                image(url)
+                for record in parts
+                for url in [record['main_picture']] + [step.get('image') for step in record['steps']]
+                if url
+            ])
+
+        return len(recipes), errors
+
+
+def read_checkpoint(path):
+    try:
+        with open(path) as file:
+            return int(file.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path, line_number):
+    """
+    Replaces the checkpoint atomically, so a crash never leaves it half written
+    """
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as file:
+        file.write(str(line_number))
+    os.replace(temporary, path)
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import statistics
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe_api.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        "Load tests a running server: keeps --concurrency clients sending "
+        "requests over keep-alive connections for the recipe list, a recipe "
+        "and its comments for --duration seconds, and reports the throughput "
+        "and latency percentiles of every endpoint. To compare the async "
+        "views with the synchronous ones, run the server with "
+        "ASYNC_READ_VIEWS=True, then False (and RECIPE_CACHE_TIMEOUT=0 for "
+        "the database to be hit), saving the first run as the baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            default='http://127.0.0.1:8000',
+            help='Base URL of the server.',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=50,
+            help='Clients sending requests at the same time.',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10,
+            help='Seconds to send requests for.',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='JSON file with the results of a previous run to compare against.',
+        )
+        parser.add_argument(
+            '--save',
+            help='Write the results to this JSON file, to be used as a baseline.',
+        )
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('--url must be an http:// URL.')
+        if options['concurrency'] < 1 or options['duration'] <= 0:
+            raise CommandError('--concurrency and --duration must be positive.')
+
+        recipe = (Recipe.objects
+                  .filter(status=Recipe.Status.PUBLISHED)
+                  .order_by('-time_created')
+                  .first())
+        if recipe is None:
+            raise CommandError('There is no published recipe to request.')
+        paths = {
+            'recipes.list': '/api/recipes/',
+            'recipes.retrieve': f'/api/recipes/{recipe.pk}/',
+            'comments.list': f'/api/recipes/{recipe.pk}/feedbacks/',
+        }
+
+        timings, errors, elapsed = asyncio.run(self.run(
+            url, paths, options['concurrency'], options['duration']
+        ))
+
+        results = {}
+        for name in paths:
+            if not timings[name]:
+                raise CommandError(f'No request for {name} succeeded ({errors[name]} errors).')
+            percentiles = statistics.quantiles(timings[name], n=100, method='inclusive')
+            results[name] = {
+                'rps': round(len(timings[name]) / elapsed, 1),
+                'p50_ms': round(statistics.median(timings[name]), 3),
+                'p95_ms': round(percentiles[94], 3),
+                'p99_ms': round(percentiles[98], 3),
+                'errors': errors[name],
+            }
+            result = results[name]
+            self.stdout.write(
+                f"  {name:<18} {result['rps']:>8.1f} req/s  p50 {result['p50_ms']:>8.2f}ms  "
+                f"p95 {result['p95_ms']:>8.2f}ms  p99 {result['p99_ms']:>8.2f}ms  "
+                f"{result['errors']} errors"
+            )
+
+        if options['save']:
+            with open(options['save'], 'w') as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+            self.stdout.write(f"Results written to {options['save']}")
+
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                self.compare(results, json.load(file))
+
+    async def run(self, url, paths, concurrency, duration):
+        timings = defaultdict(list)
+        errors = defaultdict(int)
+        deadline = time.monotonic() + duration
+
+        async def client(index):
+            names = list(paths)
+            connection = None
+            while time.monotonic() < deadline:
+                name = names[index % len(names)]
+                index += 1
+                started = time.perf_counter()
+                try:
+                    if connection is None:
+                        connection = await asyncio.open_connection(url.hostname, url.port or 80)
+                    status, keep_alive = await request(*connection, url.netloc, paths[name])
+                except (OSError, ValueError, asyncio.IncompleteReadError):
+                    errors[name] += 1
+                    status, keep_alive = None, False
+                else:
+                    if status < 400:
+                        timings[name].append((time.perf_counter() - started) * 1000)
+                    else:
+                        errors[name] += 1
+                if not keep_alive and connection is not None:
+                    connection[1].close()
+                    connection = None
+            if connection is not None:
+                connection[1].close()
+
+        started = time.monotonic()
+        await asyncio.gather(*(client(index) for index in range(concurrency)))
+        return timings, errors, time.monotonic() - started
+
+    def compare(self, results, baseline):
+        self.stdout.write(self.style.MIGRATE_HEADING('Against the baseline'))
+        for name, result in results.items():
+            previous = baseline.get(name)
+            if previous is None:
+                self.stdout.write(f'  {name}: no baseline')
+                continue
+            self.stdout.write(
+                f"  {name}: throughput {result['rps'] / previous['rps'] - 1:+.0%}, "
+                f"p50 {result['p50_ms'] / previous['p50_ms'] - 1:+.0%}, "
+                f"p95 {result['p95_ms'] / previous['p95_ms'] - 1:+.0%}, "
+                f"p99 {result['p99_ms'] / previous['p99_ms'] - 1:+.0%}"
+            )
+
+
+async def request(reader, writer, host, path):
+    """
+    Sends a GET request over the connection and reads the whole response.
+    Returns its status and whether the connection can be used again.
+    """
+    writer.write(
+        f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n\r\n'.encode()
+    )
+    await writer.drain()
+
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError('The server closed the connection.')
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip().lower()
+
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            # the chunk and its CRLF, the last one is empty
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('connection') != 'close'
@@ -0,0 +1,106 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from recipe_api import image_processing
+
+
+class Command(BaseCommand):
+    help = (
+        "Converts uploaded images waiting in the processing queue (uploads "
+        "made with IMAGE_PROCESSING_ASYNC=True). Conversion runs in a pool of "
+        "worker processes; several instances of the command can run at once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Number of worker processes, the number of CPUs by default.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10,
+            help='Images claimed from the queue at a time.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when the queue is empty.',
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=300,
+            help='Seconds after which an image being processed is queued again.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit as soon as the queue is empty.',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        # worker processes must not inherit open database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                requeued = image_processing.requeue_stale(options['stale_after'])
+                if requeued:
+                    self.stdout.write(f'Queued {requeued} stale images again')
+
+                images = image_processing.claim(options['batch_size'])
+                if not images:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                self.process(pool, images)
+
+    def process(self, pool, images):
+        started = time.monotonic()
+        futures = []
+        for image in images:
+            try:
+                content = image_processing.read(image)
+            except Exception as error:
+                self.failed(image, error)
+                continue
+            futures.append((
+                image,
+                pool.submit(image_processing.convert, content, settings.IMAGE_RENDITIONS_WEBP),
+            ))
+
+        done = 0
+        for image, future in futures:
+            try:
+                image_processing.complete(image, future.result())
+            except BrokenProcessPool:
+                # a worker died (e.g. out of memory); the claimed images are
+                # queued again once stale, by the restarted command
+                raise CommandError('The worker pool broke, exiting.')
+            except Exception as error:
+                self.failed(image, error)
+            else:
+                done += 1
+
+        self.stdout.write(
+            f'Processed {done} of {len(images)} images in {time.monotonic() - started:.2f}s'
+        )
+
+    def failed(self, image, error):
+        retry = image_processing.fail(image, error)
+        self.stderr.write(
+            f"Image {image.pk}: {error}{', will be retried' if retry else ', giving up'}"
+        )
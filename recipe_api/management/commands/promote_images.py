@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe_api import promotion
+
+
+class Command(BaseCommand):
+    help = (
+        "Promotes to the permanent directory the images of saved recipes "
+        "whose promotion after the save failed or was interrupted. Promoting "
+        "is idempotent, the command can be run at any time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Images promoted at a time.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        pks = list(promotion.unpromoted().order_by('id').values_list('id', flat=True))
+        total_promoted = total_failed = 0
+        for start in range(0, len(pks), batch_size):
+            promoted, failed = promotion.promote(pks[start:start + batch_size])
+            total_promoted += promoted
+            total_failed += failed
+            self.stdout.write(f'Promoted {total_promoted} of {len(pks)} images')
+
+        if total_failed:
+            raise CommandError(
+                f'{total_failed} images could not be promoted, run the command again.'
+            )
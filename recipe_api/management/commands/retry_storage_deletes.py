@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe_api import storage_deletes
+from recipe_api.models import PendingStorageDelete
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes the stored files left behind after their images were "
+        "deleted, because their deletion failed or the process queueing "
+        "them exited. Keys failing again stay for the next run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=storage_deletes.BATCH_SIZE,
+            help='Keys deleted per request, at most 1000.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if not 1 <= batch_size <= storage_deletes.BATCH_SIZE:
+            raise CommandError(f'--batch-size must be from 1 to {storage_deletes.BATCH_SIZE}.')
+
+        keys = list(PendingStorageDelete.objects.order_by('id').values_list('key', flat=True))
+        total_deleted = total_failed = 0
+        for start in range(0, len(keys), batch_size):
+            deleted, failed = storage_deletes.retry(keys[start:start + batch_size])
+            total_deleted += deleted
+            total_failed += failed
+
+        self.stdout.write(f'Deleted {total_deleted} files, {total_failed} failed')
+        if total_failed:
+            raise CommandError('Some files could not be deleted, run the command again.')
@@ -0,0 +1,146 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from recipe_api import storage_deletes
+from recipe_api.models import Image, Recipe, RecipeStep
+from recipe_api.storage import directory, stored_names
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes expired temporary images (uploads never used by a saved "
+        "recipe) and their files. Images are taken in chunks ordered by "
+        "expiration date, each chunk is deleted in its own transaction and "
+        "its files with batched requests running next to the next chunks. "
+        "Replaces cron_script.py; run it periodically, e.g. once a day."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Images deleted per transaction.',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help='Chunks whose files may be being deleted at once.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count the expired images and their files.',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1 or options['concurrency'] < 1:
+            raise CommandError('--chunk-size and --concurrency must be positive.')
+
+        cutoff = timezone.now()
+        started = time.monotonic()
+        images = files = failed = chunks = 0
+        position = None
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            while True:
+                chunk_started = time.monotonic()
+                if options['dry_run']:
+                    rows = list(self.expired(cutoff, position)[:chunk_size])
+                else:
+                    with transaction.atomic():
+                        rows = list(
+                            self.expired(cutoff, position)
+                            .select_for_update(skip_locked=True, of=('self', ))[:chunk_size]
+                        )
+                        self.delete_rows(rows)
+                if not rows:
+                    break
+
+                keys = [directory(image) + name for image in rows for name in stored_names(image)]
+                if not options['dry_run']:
+                    # bounded: wait for the oldest chunk before queueing one more
+                    if len(pending) >= options['concurrency']:
+                        failed += pending.popleft().result()
+                    pending.append(pool.submit(delete_files, keys))
+
+                last = rows[-1]
+                position = (last.expiration_date, last.pk)
+                chunks += 1
+                images += len(rows)
+                files += len(keys)
+                if options['verbosity'] > 1:
+                    self.stdout.write(
+                        f'Chunk {chunks}: {len(rows)} images, {len(keys)} files '
+                        f'in {(time.monotonic() - chunk_started) * 1000:.0f}ms'
+                    )
+
+            while pending:
+                failed += pending.popleft().result()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"{'Would delete' if options['dry_run'] else 'Deleted'} {images} images "
+            f"and {files} files in {chunks} chunks, {elapsed:.2f}s "
+            f"({images / elapsed if elapsed else 0:.0f} images/s, "
+            f"{files / elapsed if elapsed else 0:.0f} files/s)"
+        )
+        if failed:
+            self.stderr.write(
+                f'{failed} files could not be deleted, they are left to retry_storage_deletes'
+            )
+
+    @staticmethod
+    def expired(cutoff, position):
+        """
+        Expired temporary images not shown by any recipe, after the position
+        (expiration date, id) of the previous chunk; uses image_expired_idx
+        """
+        queryset = (
+            Image.objects
+            .filter(is_temporary=True, expiration_date__lt=cutoff)
+            .exclude(Exists(Recipe.objects.filter(main_picture=OuterRef('pk'))))
+            .exclude(Exists(RecipeStep.objects.filter(image=OuterRef('pk'))))
+            .only('id', 'image', 'renditions', 'is_promoted', 'expiration_date')
+            .order_by('expiration_date', 'id')
+        )
+        if position is not None:
+            expiration_date, pk = position
+            queryset = queryset.filter(
+                Q(expiration_date__gte=expiration_date),
+                Q(expiration_date__gt=expiration_date) | Q(id__gt=pk),
+            )
+        return queryset
+
+    @staticmethod
+    def delete_rows(rows):
+        """
+        Deletes the rows with one statement: unused images have nothing
+        to cascade to, and their files are deleted by the command itself
+        instead of the per-row delete signals
+        """
+        if rows:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {Image._meta.db_table} WHERE id = ANY(%s)',
+                    [[image.pk for image in rows]],
+                )
+
+
+def delete_files(keys):
+    """
+    Deletes the files in batched requests, returns the number that failed
+    """
+    try:
+        return len(storage_deletes.delete(keys))
+    finally:
+        connections.close_all()
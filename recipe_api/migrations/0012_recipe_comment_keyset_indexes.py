@@ -0,0 +1,27 @@
+# Generated by Django 4.1.4 on 2026-10-18 03:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_api", "0011_alter_ingredient_name"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["recipe", "-time_created", "-id"],
+                name="comment_recipe_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                condition=models.Q(("status", "Published")),
+                fields=["-time_created", "-id"],
+                name="recipe_published_created_idx",
+            ),
+        ),
+    ]
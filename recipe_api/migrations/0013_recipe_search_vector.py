@@ -0,0 +1,145 @@
+# Generated by Django 4.1.4 on 2026-10-18 03:08
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# The search document of a recipe: its name, the names of its ingredients
+# and the texts of its steps, weighted in that order. It is stored in
+# recipe_api_recipe.search_vector and refreshed by triggers whenever any
+# of the sources changes, so searching never has to join the tables.
+SEARCH_VECTOR_SQL = """
+CREATE FUNCTION recipe_api_recipe_document(recipe_id bigint, recipe_name text)
+RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('russian', coalesce(recipe_name, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM recipe_api_recipeingredient AS recipe_ingredient
+            JOIN recipe_api_ingredient AS ingredient
+                ON ingredient.id = recipe_ingredient.ingredient_id
+            WHERE recipe_ingredient.recipe_id = $1
+        ), '')), 'B')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(step.text, ' ')
+            FROM recipe_api_recipestep AS step
+            WHERE step.recipe_id = $1
+        ), '')), 'C');
+$$ LANGUAGE sql STABLE;
+
+CREATE FUNCTION recipe_api_recipe_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := recipe_api_recipe_document(NEW.id, NEW.name);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipe_api_recipe_search_vector_insert
+    BEFORE INSERT ON recipe_api_recipe
+    FOR EACH ROW EXECUTE FUNCTION recipe_api_recipe_search_vector();
+
+CREATE TRIGGER recipe_api_recipe_search_vector_update
+    BEFORE UPDATE OF name ON recipe_api_recipe
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE FUNCTION recipe_api_recipe_search_vector();
+
+-- steps and ingredients are written in bulk, so the recipes are refreshed
+-- once per statement rather than once per row
+CREATE FUNCTION recipe_api_recipe_part_search_vector() RETURNS trigger AS $$
+BEGIN
+    UPDATE recipe_api_recipe AS recipe
+    SET search_vector = recipe_api_recipe_document(recipe.id, recipe.name)
+    WHERE recipe.id IN (SELECT DISTINCT recipe_id FROM changed_rows);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipe_api_recipestep_search_vector_insert
+    AFTER INSERT ON recipe_api_recipestep
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_recipe_part_search_vector();
+
+CREATE TRIGGER recipe_api_recipestep_search_vector_update
+    AFTER UPDATE ON recipe_api_recipestep
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_recipe_part_search_vector();
+
+CREATE TRIGGER recipe_api_recipestep_search_vector_delete
+    AFTER DELETE ON recipe_api_recipestep
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_recipe_part_search_vector();
+
+CREATE TRIGGER recipe_api_recipeingredient_search_vector_insert
+    AFTER INSERT ON recipe_api_recipeingredient
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_recipe_part_search_vector();
+
+CREATE TRIGGER recipe_api_recipeingredient_search_vector_update
+    AFTER UPDATE ON recipe_api_recipeingredient
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_recipe_part_search_vector();
+
+CREATE TRIGGER recipe_api_recipeingredient_search_vector_delete
+    AFTER DELETE ON recipe_api_recipeingredient
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_recipe_part_search_vector();
+
+-- renaming an ingredient changes the document of every recipe using it
+CREATE FUNCTION recipe_api_ingredient_search_vector() RETURNS trigger AS $$
+BEGIN
+    UPDATE recipe_api_recipe AS recipe
+    SET search_vector = recipe_api_recipe_document(recipe.id, recipe.name)
+    WHERE recipe.id IN (
+        SELECT recipe_ingredient.recipe_id
+        FROM recipe_api_recipeingredient AS recipe_ingredient
+        JOIN changed_rows ON changed_rows.id = recipe_ingredient.ingredient_id
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipe_api_ingredient_search_vector_update
+    AFTER UPDATE ON recipe_api_ingredient
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_ingredient_search_vector();
+
+UPDATE recipe_api_recipe SET search_vector = recipe_api_recipe_document(id, name);
+"""
+
+REVERSE_SEARCH_VECTOR_SQL = """
+DROP TRIGGER recipe_api_ingredient_search_vector_update ON recipe_api_ingredient;
+DROP TRIGGER recipe_api_recipeingredient_search_vector_delete ON recipe_api_recipeingredient;
+DROP TRIGGER recipe_api_recipeingredient_search_vector_update ON recipe_api_recipeingredient;
+DROP TRIGGER recipe_api_recipeingredient_search_vector_insert ON recipe_api_recipeingredient;
+DROP TRIGGER recipe_api_recipestep_search_vector_delete ON recipe_api_recipestep;
+DROP TRIGGER recipe_api_recipestep_search_vector_update ON recipe_api_recipestep;
+DROP TRIGGER recipe_api_recipestep_search_vector_insert ON recipe_api_recipestep;
+DROP TRIGGER recipe_api_recipe_search_vector_update ON recipe_api_recipe;
+DROP TRIGGER recipe_api_recipe_search_vector_insert ON recipe_api_recipe;
+DROP FUNCTION recipe_api_ingredient_search_vector();
+DROP FUNCTION recipe_api_recipe_part_search_vector();
+DROP FUNCTION recipe_api_recipe_search_vector();
+DROP FUNCTION recipe_api_recipe_document(bigint, text);
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_api", "0012_recipe_comment_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="recipe_search_vector_idx"
+            ),
+        ),
+        migrations.RunSQL(SEARCH_VECTOR_SQL, REVERSE_SEARCH_VECTOR_SQL),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 4.1.4 on 2026-10-18 03:09
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+INGREDIENT_IDS_SQL = """
+CREATE FUNCTION recipe_api_recipe_ingredient_ids(recipe_id bigint)
+RETURNS bigint[] AS $$
+    SELECT coalesce(array_agg(DISTINCT ingredient_id ORDER BY ingredient_id), '{}')
+    FROM recipe_api_recipeingredient
+    WHERE recipe_api_recipeingredient.recipe_id = $1;
+$$ LANGUAGE sql STABLE;
+
+CREATE FUNCTION recipe_api_recipeingredient_ingredient_ids() RETURNS trigger AS $$
+BEGIN
+    UPDATE recipe_api_recipe AS recipe
+    SET ingredient_ids = recipe_api_recipe_ingredient_ids(recipe.id)
+    WHERE recipe.id IN (SELECT DISTINCT recipe_id FROM changed_rows);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipe_api_recipeingredient_ingredient_ids_insert
+    AFTER INSERT ON recipe_api_recipeingredient
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_recipeingredient_ingredient_ids();
+
+CREATE TRIGGER recipe_api_recipeingredient_ingredient_ids_update
+    AFTER UPDATE ON recipe_api_recipeingredient
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_recipeingredient_ingredient_ids();
+
+CREATE TRIGGER recipe_api_recipeingredient_ingredient_ids_delete
+    AFTER DELETE ON recipe_api_recipeingredient
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_recipeingredient_ingredient_ids();
+
+UPDATE recipe_api_recipe SET ingredient_ids = recipe_api_recipe_ingredient_ids(id);
+
+-- Columns derived by triggers are only written by triggers. A statement
+-- coming from the application (trigger depth 1) saving a recipe it read
+-- earlier would otherwise put stale values back.
+CREATE FUNCTION recipe_api_recipe_derived_columns() RETURNS trigger AS $$
+BEGIN
+    IF pg_trigger_depth() = 1 THEN
+        NEW.search_vector := OLD.search_vector;
+        NEW.ingredient_ids := OLD.ingredient_ids;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- named to fire before recipe_api_recipe_search_vector_update
+CREATE TRIGGER recipe_api_recipe_derived_columns
+    BEFORE UPDATE ON recipe_api_recipe
+    FOR EACH ROW EXECUTE FUNCTION recipe_api_recipe_derived_columns();
+"""
+
+REVERSE_INGREDIENT_IDS_SQL = """
+DROP TRIGGER recipe_api_recipe_derived_columns ON recipe_api_recipe;
+DROP TRIGGER recipe_api_recipeingredient_ingredient_ids_delete ON recipe_api_recipeingredient;
+DROP TRIGGER recipe_api_recipeingredient_ingredient_ids_update ON recipe_api_recipeingredient;
+DROP TRIGGER recipe_api_recipeingredient_ingredient_ids_insert ON recipe_api_recipeingredient;
+DROP FUNCTION recipe_api_recipe_derived_columns();
+DROP FUNCTION recipe_api_recipeingredient_ingredient_ids();
+DROP FUNCTION recipe_api_recipe_ingredient_ids(bigint);
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_api", "0013_recipe_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="ingredient_ids",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.BigIntegerField(),
+                default=list,
+                editable=False,
+                size=None,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["ingredient_ids"], name="recipe_ingredient_ids_idx"
+            ),
+        ),
+        migrations.RunSQL(INGREDIENT_IDS_SQL, REVERSE_INGREDIENT_IDS_SQL),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.1.4 on 2026-10-18 03:11
+
+from django.db import migrations, models
+import django.db.models.expressions
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_api", "0014_recipe_ingredient_ids"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                condition=models.Q(("status", "Published")),
+                fields=["category", "-time_created", "-id"],
+                name="recipe_published_category_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                condition=models.Q(("status", "Published")),
+                fields=["is_vegetarian", "is_spicy", "-time_created", "-id"],
+                name="recipe_published_diet_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                django.db.models.expressions.CombinedExpression(
+                    models.F("time_cooking"), "+", models.F("time_preparing")
+                ),
+                condition=models.Q(("status", "Published")),
+                name="recipe_published_time_idx",
+            ),
+        ),
+    ]
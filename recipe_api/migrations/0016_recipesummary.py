@@ -0,0 +1,166 @@
+# Generated by Django 4.1.4 on 2026-10-18 03:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+SUMMARY_SQL = """
+-- a summary row is created along with every recipe
+CREATE FUNCTION recipe_api_recipe_summary_insert() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO recipe_api_recipesummary
+        (recipe_id, ingredients_count, steps_count, comments_count, total_time)
+    SELECT id, 0, 0, 0, time_cooking + time_preparing FROM new_rows;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipe_api_recipe_summary_insert
+    AFTER INSERT ON recipe_api_recipe
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_recipe_summary_insert();
+
+CREATE FUNCTION recipe_api_recipe_summary_total_time() RETURNS trigger AS $$
+BEGIN
+    UPDATE recipe_api_recipesummary
+    SET total_time = NEW.time_cooking + NEW.time_preparing
+    WHERE recipe_id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipe_api_recipe_summary_total_time
+    AFTER UPDATE OF time_cooking, time_preparing ON recipe_api_recipe
+    FOR EACH ROW
+    WHEN (OLD.time_cooking <> NEW.time_cooking OR OLD.time_preparing <> NEW.time_preparing)
+    EXECUTE FUNCTION recipe_api_recipe_summary_total_time();
+
+-- Counters are moved by the net number of rows each recipe gained or lost
+-- in the statement, with one atomic UPDATE. Updates that do not move rows
+-- to another recipe net to zero and write nothing. The counter column is
+-- passed as the trigger argument.
+CREATE FUNCTION recipe_api_recipe_summary_count() RETURNS trigger AS $$
+DECLARE
+    changes text;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        changes := 'SELECT recipe_id, 1 AS delta FROM new_rows';
+    ELSIF TG_OP = 'DELETE' THEN
+        changes := 'SELECT recipe_id, -1 AS delta FROM old_rows';
+    ELSE
+        changes := 'SELECT recipe_id, 1 AS delta FROM new_rows '
+                   'UNION ALL SELECT recipe_id, -1 AS delta FROM old_rows';
+    END IF;
+
+    EXECUTE format(
+        'UPDATE recipe_api_recipesummary AS summary '
+        'SET %1$I = summary.%1$I + changed.delta '
+        'FROM (SELECT recipe_id, sum(delta) AS delta FROM (%2$s) AS rows '
+        '      GROUP BY recipe_id HAVING sum(delta) <> 0) AS changed '
+        'WHERE summary.recipe_id = changed.recipe_id',
+        TG_ARGV[0], changes
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipe_api_recipeingredient_summary_insert
+    AFTER INSERT ON recipe_api_recipeingredient
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_recipe_summary_count('ingredients_count');
+
+CREATE TRIGGER recipe_api_recipeingredient_summary_update
+    AFTER UPDATE ON recipe_api_recipeingredient
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_recipe_summary_count('ingredients_count');
+
+CREATE TRIGGER recipe_api_recipeingredient_summary_delete
+    AFTER DELETE ON recipe_api_recipeingredient
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_recipe_summary_count('ingredients_count');
+
+CREATE TRIGGER recipe_api_recipestep_summary_insert
+    AFTER INSERT ON recipe_api_recipestep
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_recipe_summary_count('steps_count');
+
+CREATE TRIGGER recipe_api_recipestep_summary_update
+    AFTER UPDATE ON recipe_api_recipestep
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_recipe_summary_count('steps_count');
+
+CREATE TRIGGER recipe_api_recipestep_summary_delete
+    AFTER DELETE ON recipe_api_recipestep
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_recipe_summary_count('steps_count');
+
+CREATE TRIGGER recipe_api_comment_summary_insert
+    AFTER INSERT ON recipe_api_comment
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_recipe_summary_count('comments_count');
+
+CREATE TRIGGER recipe_api_comment_summary_update
+    AFTER UPDATE ON recipe_api_comment
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_recipe_summary_count('comments_count');
+
+CREATE TRIGGER recipe_api_comment_summary_delete
+    AFTER DELETE ON recipe_api_comment
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_recipe_summary_count('comments_count');
+
+INSERT INTO recipe_api_recipesummary
+    (recipe_id, ingredients_count, steps_count, comments_count, total_time)
+SELECT
+    recipe.id,
+    (SELECT count(*) FROM recipe_api_recipeingredient WHERE recipe_id = recipe.id),
+    (SELECT count(*) FROM recipe_api_recipestep WHERE recipe_id = recipe.id),
+    (SELECT count(*) FROM recipe_api_comment WHERE recipe_id = recipe.id),
+    recipe.time_cooking + recipe.time_preparing
+FROM recipe_api_recipe AS recipe;
+"""
+
+REVERSE_SUMMARY_SQL = """
+DROP TRIGGER recipe_api_comment_summary_delete ON recipe_api_comment;
+DROP TRIGGER recipe_api_comment_summary_update ON recipe_api_comment;
+DROP TRIGGER recipe_api_comment_summary_insert ON recipe_api_comment;
+DROP TRIGGER recipe_api_recipestep_summary_delete ON recipe_api_recipestep;
+DROP TRIGGER recipe_api_recipestep_summary_update ON recipe_api_recipestep;
+DROP TRIGGER recipe_api_recipestep_summary_insert ON recipe_api_recipestep;
+DROP TRIGGER recipe_api_recipeingredient_summary_delete ON recipe_api_recipeingredient;
+DROP TRIGGER recipe_api_recipeingredient_summary_update ON recipe_api_recipeingredient;
+DROP TRIGGER recipe_api_recipeingredient_summary_insert ON recipe_api_recipeingredient;
+DROP TRIGGER recipe_api_recipe_summary_total_time ON recipe_api_recipe;
+DROP TRIGGER recipe_api_recipe_summary_insert ON recipe_api_recipe;
+DROP FUNCTION recipe_api_recipe_summary_count();
+DROP FUNCTION recipe_api_recipe_summary_total_time();
+DROP FUNCTION recipe_api_recipe_summary_insert();
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_api", "0015_recipe_facet_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecipeSummary",
+            fields=[
+                (
+                    "recipe",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="summary",
+                        serialize=False,
+                        to="recipe_api.recipe",
+                    ),
+                ),
+                ("ingredients_count", models.PositiveIntegerField(default=0)),
+                ("steps_count", models.PositiveIntegerField(default=0)),
+                ("comments_count", models.PositiveIntegerField(default=0)),
+                ("total_time", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunSQL(SUMMARY_SQL, REVERSE_SUMMARY_SQL),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.1.4 on 2026-10-18 03:13
+
+from django.db import migrations, models
+
+# Steps and ingredients are part of a recipe, so changing them moves the
+# recipe's time_updated along with its search vector.
+TIME_UPDATED_SQL = """
+UPDATE recipe_api_recipe SET time_updated = time_created;
+
+CREATE OR REPLACE FUNCTION recipe_api_recipe_part_search_vector() RETURNS trigger AS $$
+BEGIN
+    UPDATE recipe_api_recipe AS recipe
+    SET search_vector = recipe_api_recipe_document(recipe.id, recipe.name),
+        time_updated = now()
+    WHERE recipe.id IN (SELECT DISTINCT recipe_id FROM changed_rows);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+REVERSE_TIME_UPDATED_SQL = """
+CREATE OR REPLACE FUNCTION recipe_api_recipe_part_search_vector() RETURNS trigger AS $$
+BEGIN
+    UPDATE recipe_api_recipe AS recipe
+    SET search_vector = recipe_api_recipe_document(recipe.id, recipe.name)
+    WHERE recipe.id IN (SELECT DISTINCT recipe_id FROM changed_rows);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_api", "0016_recipesummary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="time_updated",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                condition=models.Q(("status", "Published")),
+                fields=["time_updated", "id"],
+                name="recipe_published_updated_idx",
+            ),
+        ),
+        migrations.RunSQL(TIME_UPDATED_SQL, REVERSE_TIME_UPDATED_SQL),
+    ]
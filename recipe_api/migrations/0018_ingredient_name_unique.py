@@ -0,0 +1,39 @@
+# Generated by Django 4.1.4 on 2026-10-18 03:17
+
+from django.db import migrations, models
+
+# Recipes using a duplicated ingredient are pointed to its oldest row
+# before the duplicates are dropped and the name is made unique.
+DEDUPLICATE_SQL = """
+UPDATE recipe_api_recipeingredient AS recipe_ingredient
+SET ingredient_id = duplicate.original_id
+FROM (
+    SELECT id, min(id) OVER (PARTITION BY name) AS original_id
+    FROM recipe_api_ingredient
+) AS duplicate
+WHERE recipe_ingredient.ingredient_id = duplicate.id
+  AND duplicate.id <> duplicate.original_id;
+
+DELETE FROM recipe_api_ingredient AS duplicate
+USING recipe_api_ingredient AS original
+WHERE duplicate.name = original.name AND duplicate.id > original.id;
+
+-- runs the deferred foreign key checks now, the table cannot be altered
+-- while they are pending
+SET CONSTRAINTS ALL IMMEDIATE;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_api", "0017_recipe_time_updated"),
+    ]
+
+    operations = [
+        migrations.RunSQL(DEDUPLICATE_SQL, migrations.RunSQL.noop),
+        migrations.AlterField(
+            model_name="ingredient",
+            name="name",
+            field=models.CharField(max_length=100, unique=True),
+        ),
+    ]
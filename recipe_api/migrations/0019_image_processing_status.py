@@ -0,0 +1,49 @@
+# Generated by Django 4.1.4 on 2026-10-18 03:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_api", "0018_ingredient_name_unique"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="image",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="image",
+            name="claimed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="image",
+            name="error",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="image",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("Pending", "Pending"),
+                    ("Processing", "Processing"),
+                    ("Ready", "Ready"),
+                    ("Failed", "Failed"),
+                ],
+                default="Ready",
+                max_length=10,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="image",
+            index=models.Index(
+                condition=models.Q(("status__in", ["Pending", "Processing"])),
+                fields=["id"],
+                name="image_queued_idx",
+            ),
+        ),
+    ]
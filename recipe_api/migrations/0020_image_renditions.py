@@ -0,0 +1,17 @@
+# Generated by Django 4.1.4 on 2026-10-18 03:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_api", "0019_image_processing_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="image",
+            name="renditions",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.4 on 2026-10-18 03:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_api", "0020_image_renditions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="image",
+            name="is_promoted",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name="image",
+            index=models.Index(
+                condition=models.Q(("is_promoted", False), ("is_temporary", False)),
+                fields=["id"],
+                name="image_unpromoted_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.1.4 on 2026-10-18 03:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_api", "0021_image_promotion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingStorageDelete",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=1024, unique=True)),
+                ("attempts", models.PositiveSmallIntegerField(default=1)),
+                ("error", models.TextField(blank=True)),
+                ("time_created", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.1.4 on 2026-10-18 03:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_api", "0022_pending_storage_delete"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="image",
+            index=models.Index(
+                condition=models.Q(("is_temporary", True)),
+                fields=["expiration_date", "id"],
+                name="image_expired_idx",
+            ),
+        ),
+    ]
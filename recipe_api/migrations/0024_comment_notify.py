@@ -0,0 +1,39 @@
+# Generated by Django 4.1.4 on 2026-10-18 03:40
+
+from django.db import migrations
+
+# Every new comment is announced on the recipe_comments channel once its
+# transaction commits, as {"recipe": <recipe id>, "id": <comment id>};
+# comment streams (recipe_api.streams) listen to it.
+NOTIFY_SQL = """
+CREATE FUNCTION recipe_api_comment_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify(
+        'recipe_comments',
+        json_build_object('recipe', recipe_id, 'id', id)::text
+    )
+    FROM new_rows;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipe_api_comment_notify
+    AFTER INSERT ON recipe_api_comment
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_comment_notify();
+"""
+
+REVERSE_NOTIFY_SQL = """
+DROP TRIGGER recipe_api_comment_notify ON recipe_api_comment;
+DROP FUNCTION recipe_api_comment_notify();
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_api", "0023_image_expired_index"),
+    ]
+
+    operations = [
+        migrations.RunSQL(NOTIFY_SQL, REVERSE_NOTIFY_SQL),
+    ]
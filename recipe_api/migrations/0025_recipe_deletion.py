@@ -0,0 +1,51 @@
+# Generated by Django 4.1.4 on 2026-10-18 04:33
+
+from django.db import migrations, models
+
+# Deleted recipes leave their id behind for incremental exports, whichever
+# way they were deleted (API, admin, cascades or plain SQL).
+DELETION_SQL = """
+CREATE FUNCTION recipe_api_recipe_deletion() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO recipe_api_recipedeletion (recipe_id, time_deleted)
+    SELECT id, now() FROM old_rows;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipe_api_recipe_deletion
+    AFTER DELETE ON recipe_api_recipe
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_api_recipe_deletion();
+"""
+
+REVERSE_DELETION_SQL = """
+DROP TRIGGER recipe_api_recipe_deletion ON recipe_api_recipe;
+DROP FUNCTION recipe_api_recipe_deletion();
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_api", "0024_comment_notify"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecipeDeletion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("recipe_id", models.BigIntegerField()),
+                ("time_deleted", models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.RunSQL(DELETION_SQL, REVERSE_DELETION_SQL),
+    ]
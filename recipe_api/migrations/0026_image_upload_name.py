@@ -0,0 +1,55 @@
+# Generated by Django 4.1.4 on 2026-10-18 04:38
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_images(apps, schema_editor):
+    """
+    Finalizing an upload twice at once could register its file twice. The
+    recipes showing a duplicate are moved to the most advanced image of the
+    file (kept, then promoted, then the first one), the others are deleted.
+    """
+    Image = apps.get_model('recipe_api', 'Image')
+    Recipe = apps.get_model('recipe_api', 'Recipe')
+    RecipeStep = apps.get_model('recipe_api', 'RecipeStep')
+
+    duplicated = (
+        Image.objects
+        .exclude(image='')
+        .values('image')
+        .annotate(count=Count('id'))
+        .filter(count__gt=1)
+        .values_list('image', flat=True)
+    )
+    for name in duplicated:
+        kept, *others = Image.objects.filter(image=name).order_by('is_temporary', '-is_promoted', 'id')
+        others = [image.pk for image in others]
+        Recipe.objects.filter(main_picture__in=others).update(main_picture=kept)
+        RecipeStep.objects.filter(image__in=others).update(image=kept)
+        Image.objects.filter(pk__in=others).delete()
+    # the unique index cannot be built while foreign key checks are deferred
+    schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_api", "0025_recipe_deletion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="image",
+            name="upload_name",
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.RunPython(merge_duplicate_images, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="image",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("image", ""), _negated=True),
+                fields=("image",),
+                name="image_unique_file",
+            ),
+        ),
+    ]
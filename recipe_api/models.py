@@ -2,6 +2,9 @@ from datetime import datetime, timedelta
 from decimal import Decimal
 from uuid import uuid4
 
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 from django.utils import timezone
@@ -20,20 +23,89 @@ def get_default_expiration_date():
 
 
 class Image(models.Model):
+
+    class Status(models.TextChoices):
+        # uploaded as is, waiting for a `process_images` worker
+        PENDING = "Pending"
+        PROCESSING = "Processing"
+        READY = "Ready"
+        FAILED = "Failed"
+
     image = models.ImageField(
         upload_to=get_file_path,
         blank=True,
         null=True,
     )
     is_temporary = models.BooleanField(default=True)
+    # the files have been copied to the permanent directory
+    is_promoted = models.BooleanField(default=False)
     expiration_date = models.DateTimeField(default=get_default_expiration_date)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.READY
+    )
+    # processing attempts made so far, the last one started at claimed_at
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    # file names and sizes of the scaled copies by rendition and format, e.g.
+    # {"thumbnail": {"width": 200, "height": 150, "jpeg": "...", "webp": "..."}}
+    renditions = models.JSONField(default=dict, blank=True)
+    # key of a file uploaded straight to the storage, kept once the image
+    # field names the processed file, so that finalizing again finds it
+    upload_name = models.CharField(max_length=100, unique=True, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # a file deleted with one image must not be shown by another
+            models.UniqueConstraint(
+                fields=['image'],
+                name='image_unique_file',
+                condition=~models.Q(image=''),
+            ),
+        ]
+        indexes = [
+            # the processing queue
+            models.Index(
+                fields=['id'],
+                name='image_queued_idx',
+                condition=models.Q(status__in=['Pending', 'Processing']),
+            ),
+            # expired temporary images, swept by `sweep_images`
+            models.Index(
+                fields=['expiration_date', 'id'],
+                name='image_expired_idx',
+                condition=models.Q(is_temporary=True),
+            ),
+            # kept images whose files are still to be promoted
+            models.Index(
+                fields=['id'],
+                name='image_unpromoted_idx',
+                condition=models.Q(is_temporary=False, is_promoted=False),
+            ),
+        ]
 
     def __str__(self):
         return self.image.url
 
 
+class PendingStorageDelete(models.Model):
+    """
+    Key of a stored file to delete, written with the deletion of its row
+    and removed once the file is deleted; those left behind are retried
+    by `retry_storage_deletes`
+    """
+    key = models.CharField(max_length=1024, unique=True)
+    # failed deletions, none while the key is queued
+    attempts = models.PositiveSmallIntegerField(default=1)
+    error = models.TextField(blank=True)
+    time_created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.key
+
+
 class Ingredient(models.Model):
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, unique=True)
 
     def __str__(self):
         return self.name
@@ -80,16 +152,90 @@ class Recipe(models.Model):
     )
     category = models.CharField(max_length=30, choices=Category.choices)
     time_created = models.DateTimeField(auto_now_add=True)
+    # also moved by changes of steps and ingredients (see migration 0017)
+    time_updated = models.DateTimeField(auto_now=True)
     main_picture = models.ForeignKey(
         Image,
         on_delete=models.SET_NULL,
         null=True
     )
+    # name, ingredient names and step texts; kept up to date by triggers
+    # in the database (see migration 0013)
+    search_vector = SearchVectorField(null=True, editable=False)
+    # sorted ids of the recipe ingredients, an inverted index for searching
+    # by ingredients; kept up to date by triggers (see migration 0014)
+    ingredient_ids = ArrayField(models.BigIntegerField(), default=list, editable=False)
+
+    class Meta:
+        indexes = [
+            # keyset pagination of published recipes
+            models.Index(
+                fields=['-time_created', '-id'],
+                name='recipe_published_created_idx',
+                condition=models.Q(status='Published'),
+            ),
+            # filtered lists of published recipes
+            models.Index(
+                fields=['category', '-time_created', '-id'],
+                name='recipe_published_category_idx',
+                condition=models.Q(status='Published'),
+            ),
+            models.Index(
+                fields=['is_vegetarian', 'is_spicy', '-time_created', '-id'],
+                name='recipe_published_diet_idx',
+                condition=models.Q(status='Published'),
+            ),
+            models.Index(
+                models.F('time_cooking') + models.F('time_preparing'),
+                name='recipe_published_time_idx',
+                condition=models.Q(status='Published'),
+            ),
+            # incremental export of published recipes
+            models.Index(
+                fields=['time_updated', 'id'],
+                name='recipe_published_updated_idx',
+                condition=models.Q(status='Published'),
+            ),
+            GinIndex(fields=['search_vector'], name='recipe_search_vector_idx'),
+            GinIndex(fields=['ingredient_ids'], name='recipe_ingredient_ids_idx'),
+        ]
 
     def __str__(self):
         return f'{self.name} by {self.author.user_name}'
 
 
+class RecipeDeletion(models.Model):
+    """
+    Id of a deleted recipe, passed on by incremental exports.
+    Rows are written by a trigger (see migration 0025).
+    """
+    recipe_id = models.BigIntegerField()
+    time_deleted = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f'Recipe {self.recipe_id} deleted'
+
+
+class RecipeSummary(models.Model):
+    """
+    Denormalized counters of a recipe for list pages.
+    Rows are created and kept up to date by triggers (see migration 0016).
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="summary",
+    )
+    ingredients_count = models.PositiveIntegerField(default=0)
+    steps_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    total_time = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'Summary for recipe {self.recipe_id}'
+
+
 class RecipeStep(models.Model):
 
     text = models.TextField(max_length=500)
@@ -116,6 +262,15 @@ class Comment(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True)
     time_created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # keyset pagination of comments on a recipe
+            models.Index(
+                fields=['recipe', '-time_created', '-id'],
+                name='comment_recipe_created_idx',
+            ),
+        ]
+
     def __str__(self):
         return str(self.id)
 
@@ -1,14 +1,30 @@
-from rest_framework.pagination import PageNumberPagination
+from hashlib import md5
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination, _reverse_ordering)
 from rest_framework.response import Response
 
 
 DEFAULT_PAGE = 1
 DEFAULT_PAGE_SIZE = 2
+MAX_PAGE_SIZE = 100
+
+# how long (in seconds) the number of rows behind a paginated list is cached
+TOTAL_CACHE_TIMEOUT = 60
+
+POSITION_SEPARATOR = '|'
+
 
 class CustomPagination(PageNumberPagination):
     page = DEFAULT_PAGE
     page_size = DEFAULT_PAGE_SIZE
     page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
 
     def get_paginated_response(self, data):
         return Response({
@@ -17,7 +33,138 @@ class CustomPagination(PageNumberPagination):
                 'previous': self.get_previous_link()
             },
             'total': self.page.paginator.count,
-            'page': int(self.request.GET.get('page', DEFAULT_PAGE)), # can not set default = self.page
-            'page_size': int(self.request.GET.get('page_size', self.page_size)),
+            'page': int(self.request.GET.get('page', DEFAULT_PAGE)),  # can not set default = self.page
+            'page_size': self.page.paginator.per_page,
+            'results': data
+        })
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination seeking on the (time_created, id) pair,
+    so that neither COUNT(*) nor OFFSET is needed to get a page.
+    """
+    ordering = ('-time_created', '-id')
+    page_size = DEFAULT_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+    # set to False to skip counting rows behind the list at all
+    count_total = True
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        `paginate_queryset()` fetching the page with the async ORM
+        """
+        return self.set_page([row async for row in self.page_queryset(queryset, request, view)])
+
+    def page_queryset(self, queryset, request, view=None):
+        """
+        Returns the query of the requested page, with one extra row
+        telling whether there is a page after it
+        """
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.request = request
+        self.queryset = queryset
+        self.view = view
+
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+
+        if self.cursor is not None and self.cursor.position is not None:
+            queryset = self.seek(queryset, self.cursor.position, ordering)
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if self.cursor is not None and self.cursor.reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def seek(self, queryset, position, ordering):
+        """
+        Filters out the rows up to and including the given position.
+        The leading column is bounded on its own so the index range scan
+        can be used, the second one only breaks ties.
+        """
+        values = position.split(POSITION_SEPARATOR)
+        if len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        (first, second) = (field.lstrip('-') for field in ordering)
+        lookup = 'lt' if ordering[0].startswith('-') else 'gt'
+        (first_value, second_value) = values
+
+        try:
+            return queryset.filter(
+                Q(**{f'{first}__{lookup}e': first_value}),
+                Q(**{f'{first}__{lookup}': first_value}) |
+                Q(**{f'{second}__{lookup}': second_value}),
+            )
+        except (ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_position_from_instance(self, instance, ordering):
+        return POSITION_SEPARATOR.join(
+            str(getattr(instance, field.lstrip('-'))) for field in ordering
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def get_total(self):
+        """
+        Returns the number of rows behind the list. Views keeping that
+        number at hand (e.g. in a counter) give it by `pagination_total()`;
+        otherwise it is counted and cached for TOTAL_CACHE_TIMEOUT seconds
+        so that COUNT(*) does not run on every page request.
+        """
+        if not self.count_total:
+            return None
+        pagination_total = getattr(self.view, 'pagination_total', None)
+        if pagination_total is not None:
+            total = pagination_total()
+            if total is not None:
+                return total
+        key = 'pagination:total:%s' % md5(str(self.queryset.query).encode()).hexdigest()
+        return cache.get_or_set(key, self.queryset.count, TOTAL_CACHE_TIMEOUT)
+
+    def get_paginated_response(self, data, total=None):
+        return Response({
+            'links': {
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link()
+            },
+            'total': self.get_total() if total is None else total,
+            'page_size': self.page_size,
             'results': data
-        })
\ No newline at end of file
+        })
+
+    async def aget_paginated_response(self, data):
+        total = await sync_to_async(self.get_total)()
+        return self.get_paginated_response(data, total)
@@ -5,9 +5,9 @@ class IsOwnerOrReadOnly(BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in SAFE_METHODS:
             return True
-        return request.user == obj.author
+        return obj.author_id == request.user.pk
 
 
 class IsOwner(BasePermission):
     def has_object_permission(self, request, view, obj):
-        return request.user == obj.author
\ No newline at end of file
+        return obj.author_id == request.user.pk
@@ -0,0 +1,110 @@
+"""
+Promotion of the images used by saved recipes to the permanent directory.
+
+Saving a recipe marks every image it shows as kept (is_temporary=False) with
+one UPDATE, in the transaction of the recipe. Once the transaction commits,
+the files of these images are copied server-side to the permanent directory
+in parallel; an image is flagged as promoted, and its temporary files
+queued for deletion, only when all of its copies succeeded. Copying again
+is harmless, so images left behind by a failure are promoted by
+`promote_images` later.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from myproject.storage_backends import s3_client
+
+from . import cache as recipe_cache
+from . import storage_deletes
+from .models import Image, Recipe
+from .storage import stored_names
+
+logger = logging.getLogger(__name__)
+
+
+def keep(images):
+    """
+    Marks the given images as kept, and has their files promoted after
+    the current transaction commits. Images already promoted cost nothing.
+    """
+    pks = {image.pk for image in images if image is not None and not image.is_promoted}
+    if not pks:
+        return
+    Image.objects.filter(pk__in=pks, is_temporary=True).update(is_temporary=False)
+    for image in images:
+        if image is not None and image.pk in pks:
+            image.is_temporary = False
+    transaction.on_commit(lambda: promote_safely(pks))
+
+
+def promote_safely(pks):
+    """
+    Promotes the images after a commit, where a failure must not fail the
+    request that was just committed
+    """
+    try:
+        promote(pks)
+    except Exception:
+        logger.exception('Promotion of images %s failed, left to promote_images', sorted(pks))
+
+
+def unpromoted():
+    return Image.objects.filter(is_temporary=False, is_promoted=False)
+
+
+def promote(pks):
+    """
+    Copies the files of the given kept images, those not promoted yet, to
+    the permanent directory. Returns the numbers of promoted images and of
+    images that failed.
+    """
+    images = list(unpromoted().filter(pk__in=pks))
+    if not images:
+        return 0, 0
+
+    copies = [(image, name) for image in images for name in stored_names(image)]
+    with ThreadPoolExecutor(max_workers=settings.AWS_S3_MAX_POOL_CONNECTIONS) as pool:
+        results = list(pool.map(_copy, [name for _, name in copies]))
+
+    failed = {image.pk for (image, _), ok in zip(copies, results) if not ok}
+    promoted = [image for image in images if image.pk not in failed]
+    if promoted:
+        promoted_pks = [image.pk for image in promoted]
+        Image.objects.filter(pk__in=promoted_pks).update(is_promoted=True)
+        recipe_cache.invalidate(*showing(promoted_pks))
+        storage_deletes.delete_later(
+            settings.AWS_LOCATION + name for image in promoted for name in stored_names(image)
+        )
+    return len(promoted), len(failed)
+
+
+def showing(image_pks):
+    """
+    Returns the pks of the recipes showing any of the images
+    """
+    return list(
+        Recipe.objects
+        .filter(Q(main_picture__in=image_pks) | Q(steps__image__in=image_pks))
+        .values_list('pk', flat=True)
+        .distinct()
+    )
+
+
+def _copy(name):
+    try:
+        s3_client().copy_object(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+            CopySource={
+                'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
+                'Key': settings.AWS_LOCATION + name,
+            },
+            Key=settings.AWS_PERMANENT_DIRECTORY + name,
+        )
+    except Exception:
+        logger.exception('Copying image file %s failed', name)
+        return False
+    return True
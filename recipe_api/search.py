@@ -0,0 +1,52 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField, Func, IntegerField
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+# text search configuration the search_vector column is built with
+# (see migration 0013), queries have to be parsed with the same one
+SEARCH_CONFIG = 'russian'
+
+
+def search_recipes(queryset, text):
+    """
+    Filters recipes matching the search text and orders them by relevance.
+    Supports the web search syntax: "quoted phrases", OR and -exclusions.
+    """
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    return (queryset
+            .filter(search_vector=query)
+            .annotate(rank=SearchRank(F('search_vector'), query))
+            .order_by('-rank', '-id')
+            )
+
+
+def cookable_recipes(queryset, ingredient_ids, min_coverage=1.0):
+    """
+    Filters recipes that can be cooked from the given ingredients.
+    The share of a recipe's ingredients found among the given ones is
+    annotated as `coverage`, recipes below `min_coverage` are left out,
+    the best covered come first.
+    """
+    ingredient_ids = sorted(set(ingredient_ids))
+    matched = RawSQL(
+        '(SELECT count(*) FROM unnest("recipe_api_recipe"."ingredient_ids") AS ingredient_id '
+        'WHERE ingredient_id = ANY(%s))',
+        (ingredient_ids, ),
+        output_field=IntegerField(),
+    )
+    total = Func(F('ingredient_ids'), function='cardinality', output_field=IntegerField())
+
+    # both lookups are answered by the GIN index on ingredient_ids
+    queryset = queryset.filter(ingredient_ids__overlap=ingredient_ids)
+    if min_coverage >= 1:
+        queryset = queryset.filter(ingredient_ids__contained_by=ingredient_ids)
+
+    return (queryset
+            .annotate(
+                matched_ingredients=matched,
+                coverage=Cast(matched, FloatField()) / Cast(total, FloatField()),
+            )
+            .filter(coverage__gte=min_coverage)
+            .order_by('-coverage', '-matched_ingredients', '-id')
+            )
@@ -1,83 +1,174 @@
-import re
+from operator import attrgetter
 
 from django.conf import settings
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from django.utils.translation import gettext_lazy as _
-from PIL import Image as PillowImage
 from rest_framework import serializers
 
+from utils.image_converter import InvalidImage, RenditionConverter
+
+from . import cache as recipe_cache
+from . import ingredients as ingredient_catalogue
+from . import promotion, uploads
 from .models import (Comment, Image, Ingredient, Recipe, RecipeIngredient,
                      RecipeStep)
+from .storage import (PendingImage, file_name, image_url, rendition_urls,
+                      resolve_images)
 
 
 class StorageURLField(serializers.Field):
     """
     Field that contains image URL from storage
-    and that is converted into Image model object
-    """
+    and that is converted into Image model object.
 
-    S3_URL_REGEX = (rf'{settings.AWS_S3_ENDPOINT_URL}/'
-                    f'{settings.AWS_STORAGE_BUCKET_NAME}/'
-                    f'{settings.AWS_LOCATION}.+$')
+    The Image is not looked up by the field itself: serializers using
+    the field (or nesting serializers that do) derive from
+    ResolveImagesMixin, which looks up all images of a payload at once.
+    """
 
     def to_internal_value(self, url):
         """
-        Return the corresponding Image object from the database for the given URL.
-        Raises ValidationError if URL does not match the expected pattern S3_URL_REGEX.
-        Raises ValidationError if corresponding Image object does not exist in DB.
+        Raises ValidationError if URL does not match the storage URL pattern
         """
-
-        if not re.fullmatch(self.S3_URL_REGEX, url):
+        name = file_name(url) if isinstance(url, str) else None
+        if name is None:
             raise serializers.ValidationError("Invalid URL.")
-
-        filename = url.split('/')[-1]
-
-        try:
-            obj = Image.objects.get(image=filename)
-            return obj
-        except Image.DoesNotExist:
-            raise serializers.ValidationError("Such file does not exist")
-        else:
-            raise serializers.ValidationError("Invalid file URL")
+        return PendingImage(name)
 
     def to_representation(self, value):
         """
         Returns image url
         """
-        return str(value)
+        return image_url(value.image.name, value.is_promoted)
+
+
+class RenditionsField(serializers.Field):
+    """
+    Read-only field with the URLs of an image scaled to the given rendition,
+    or to each of the given renditions
+    """
+
+    def __init__(self, renditions, **kwargs):
+        self.renditions = renditions
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if isinstance(self.renditions, str):
+            return rendition_urls(value, self.renditions)
+        return {name: rendition_urls(value, name) for name in self.renditions}
+
+
+class ResolveImagesMixin:
+    """
+    Looks up the images of all StorageURLFields in the serializer tree with
+    one query, once the fields have been validated
+    """
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        # nested serializers leave it to the root one
+        if self.parent is None:
+            value, errors = resolve_images(value)
+            if errors:
+                raise serializers.ValidationError(errors)
+        return value
 
 
 class ImagePostSerializer(serializers.ModelSerializer):
     """
     Serializer for images apart
     """
-    image = serializers.ImageField(use_url=True)
+    # a plain file field: serializers.ImageField would decode and verify
+    # the whole upload on its own before validate_image
+    image = serializers.FileField(use_url=True)
 
     class Meta:
         model = Image
         fields = ('image',)
 
     def validate_image(self, image):
-        """ Checks whether the image format is supported. """
-
+        """
+        Checks whether the image format is supported and the image is not
+        too large, reading its header only. The opened image is kept as
+        `image.image` for the conversion.
+        """
         try:
-            with PillowImage.open(image) as img:
-                if img.format not in settings.ALLOWED_UPLOAD_IMAGES:
-                    raise serializers.ValidationError(
-                        _('Unsupported image format. Only JPEG and PNG are supported.')
-                    )
-        except IOError:
+            image.image = RenditionConverter.open(
+                image,
+                settings.ALLOWED_UPLOAD_IMAGES,
+                settings.IMAGE_MAX_PIXELS,
+            )
+        except InvalidImage as error:
+            if error.reason == 'format':
+                raise serializers.ValidationError(
+                    _('Unsupported image format. Only JPEG and PNG are supported.')
+                )
+            if error.reason == 'size':
+                raise serializers.ValidationError(
+                    _('The image is too large, at most %(pixels)d pixels are allowed.')
+                    % {'pixels': settings.IMAGE_MAX_PIXELS}
+                )
             raise serializers.ValidationError('Invalid image file.')
 
         return image
 
 
+class ImageStatusSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the processing status of an uploaded image
+    """
+    image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Image
+        fields = ('id', 'status', 'image')
+
+    def get_image(self, obj):
+        """
+        Returns image url once the image is processed
+        """
+        if obj.status != Image.Status.READY:
+            return None
+        return image_url(obj.image.name, obj.is_promoted)
+
+
+class PresignRequestSerializer(serializers.Serializer):
+    """
+    Serializer for a request of a direct upload to the storage
+    """
+    content_type = serializers.ChoiceField(choices=tuple(uploads.CONTENT_TYPES))
+
+
+class PresignedUploadSerializer(serializers.Serializer):
+    """
+    Serializer for a presigned POST: the file is sent as the `file` field
+    of a multipart form with the given fields, then finalized with the token
+    """
+    url = serializers.URLField()
+    fields = serializers.DictField(child=serializers.CharField())
+    token = serializers.CharField()
+
+
+class FinalizeUploadSerializer(serializers.Serializer):
+    """
+    Serializer for finalizing a direct upload
+    """
+    token = serializers.CharField()
+
+
 class RecipeListSerializer(serializers.ModelSerializer):
     """
     Serializer for a list of recipes on home page
     """
     main_picture = StorageURLField()
+    main_picture_thumbnail = RenditionsField('thumbnail', source='main_picture')
     author = serializers.StringRelatedField()
+    ingredients_count = serializers.IntegerField(source='summary.ingredients_count')
+    steps_count = serializers.IntegerField(source='summary.steps_count')
+    comments_count = serializers.IntegerField(source='summary.comments_count')
+    total_time = serializers.IntegerField(source='summary.total_time')
 
     class Meta:
         model = Recipe
@@ -89,9 +180,72 @@ class RecipeListSerializer(serializers.ModelSerializer):
             'is_vegetarian',
             'servings_number',
             'main_picture',
+            'main_picture_thumbnail',
+            'ingredients_count',
+            'steps_count',
+            'comments_count',
+            'total_time',
         )
 
 
+class CookableRecipeSerializer(RecipeListSerializer):
+    """
+    Serializer for recipes found by the ingredients at hand
+    """
+    coverage = serializers.FloatField(read_only=True)
+    matched_ingredients = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeListSerializer.Meta):
+        fields = RecipeListSerializer.Meta.fields + ('coverage', 'matched_ingredients')
+
+
+class CookableQuerySerializer(serializers.Serializer):
+    """
+    Serializer for query parameters of the search by ingredients
+    """
+    ingredients = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        max_length=100,
+    )
+    min_coverage = serializers.FloatField(min_value=0.01, max_value=1, default=1)
+
+    def validate_ingredients(self, values):
+        """
+        Resolves ingredient ids or names into ids
+        """
+        # isdigit() also takes e.g. superscripts, which int() does not
+        ids = {int(value) for value in values if value.isdecimal()}
+        names = {value for value in values if not value.isdecimal()}
+
+        found_names = ingredient_catalogue.resolve(names)
+        found_ids = set(
+            Ingredient.objects.filter(id__in=ids).values_list('id', flat=True)
+        ) if ids else set()
+
+        unknown = (names - found_names.keys()) | (ids - found_ids)
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown ingredients: {', '.join(sorted(map(str, unknown)))}"
+            )
+        return sorted(found_ids | set(found_names.values()))
+
+
+class RecipeFilterSerializer(serializers.Serializer):
+    """
+    Serializer for query parameters filtering the list of recipes
+    """
+    category = serializers.ListField(
+        child=serializers.ChoiceField(choices=Recipe.Category.choices),
+        required=False,
+    )
+    is_spicy = serializers.BooleanField(required=False)
+    is_vegetarian = serializers.BooleanField(required=False)
+    time_min = serializers.IntegerField(min_value=0, required=False)
+    time_max = serializers.IntegerField(min_value=0, required=False)
+    facets = serializers.BooleanField(default=False)
+
+
 class StepSerializer(serializers.ModelSerializer):
     """
     Serializer for recipe steps
@@ -113,20 +267,13 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         model = RecipeIngredient
         fields = ('ingredient', 'unit', 'amount')
 
-    def validate_ingredient(self, value):
-        """
-        Check if the ingredient already exists in the database
-        """
-        if not Ingredient.objects.filter(name=value).exists():
-            raise serializers.ValidationError(f"Ingredient '{value}' does not exist.")
-        return value
-
 
-class RecipeDetailedSerializer(serializers.ModelSerializer):
+class RecipeDetailedSerializer(ResolveImagesMixin, serializers.ModelSerializer):
     """
     Serializer for a certain recipe - more fields included
     """
     main_picture = StorageURLField(required=True)
+    main_picture_renditions = RenditionsField(('medium', 'full'), source='main_picture')
     ingredients = RecipeIngredientSerializer(many=True)
     steps = StepSerializer(many=True)
     author = serializers.StringRelatedField()
@@ -144,10 +291,52 @@ class RecipeDetailedSerializer(serializers.ModelSerializer):
             'time_preparing',
             'time_created',
             'main_picture',
+            'main_picture_renditions',
             'ingredients',
             'steps',
         )
 
+    @staticmethod
+    def part_prefetches():
+        """
+        Prefetches of the recipe parts along with what is rendered of them
+        """
+        return (
+            Prefetch(
+                'ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient').order_by('id'),
+            ),
+            Prefetch(
+                'steps',
+                queryset=RecipeStep.objects.select_related('image').order_by('id'),
+            ),
+        )
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Loads everything the serializer renders along with the recipes
+        """
+        return (queryset
+                .select_related('author', 'main_picture')
+                .defer('search_vector', 'ingredient_ids')
+                .prefetch_related(*RecipeDetailedSerializer.part_prefetches()))
+
+    def validate_ingredients(self, items):
+        """
+        Resolves the ingredient names of all items at once
+        and checks that every one of them exists
+        """
+        ids = ingredient_catalogue.resolve({item['ingredient'] for item in items})
+        errors = [
+            {} if item['ingredient'] in ids
+            else {'ingredient': [f"Ingredient '{item['ingredient']}' does not exist."]}
+            for item in items
+        ]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return [{**item, 'ingredient_id': ids[item['ingredient']]} for item in items]
+
     def validate(self, data):
         """
         Check if recipe has ingredients and steps
@@ -160,6 +349,7 @@ class RecipeDetailedSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Recipe must have at least one step')
         return data
 
+    @transaction.atomic
     def create(self, validated_data):
         # get author from request
         validated_data['author'] = self.context['request'].user
@@ -169,86 +359,144 @@ class RecipeDetailedSerializer(serializers.ModelSerializer):
         # create recipe instance
         recipe_obj = Recipe.objects.create(**validated_data)
 
-        # create ingedients and connections
-        recipe_ingredients = [
-            RecipeIngredient(
-                recipe=recipe_obj,
-                ingredient=Ingredient.objects.get(
-                    name=ingredient_dict['ingredient']
-                ),
-                unit=ingredient_dict["unit"],
-                amount=ingredient_dict["amount"],
-            ) for ingredient_dict in ingredients_list
-        ]
-
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
-        recipe_obj.ingredients.set(recipe_ingredients)
-
-        # create steps
-        steps_in_recipe = [
-            RecipeStep(
-                text=step_dict['text'],
-                recipe=recipe_obj,
-                image=step_dict.get('image', None)
-            ) for step_dict in steps_list
-        ]
-
-        RecipeStep.objects.bulk_create(steps_in_recipe)
-        recipe_obj.steps.set(steps_in_recipe)
+        RecipeIngredient.objects.bulk_create([
+            self.new_ingredient(recipe_obj, ingredient_dict)
+            for ingredient_dict in ingredients_list
+        ])
+        RecipeStep.objects.bulk_create([
+            self.new_step(recipe_obj, step_dict) for step_dict in steps_list
+        ])
 
-        # change image flag 'is_temporary' to False
-        image = recipe_obj.main_picture
-        image.is_temporary = False
-        image.save()
+        # keep the images of the recipe and promote them once it is saved
+        promotion.keep(self.images(validated_data, steps_list))
 
         return recipe_obj
 
+    @transaction.atomic
     def update(self, instance, validated_data):
+        """
+        Writes only what differs from the stored recipe: changed fields of
+        the recipe itself and the added, changed and removed parts
+        """
         ingredients_list = validated_data.pop('ingredients')
         steps_list = validated_data.pop('steps')
 
-        instance.name = validated_data.get('name')
-        instance.time_cooking = validated_data.get('time_cooking')
-        instance.time_preparing = validated_data.get('time_preparing')
-        instance.is_spicy = validated_data.get('is_spicy')
-        instance.is_vegetarian = validated_data.get('is_vegetarian')
-        instance.servings_number = validated_data.get('servings_number')
-        instance.status = validated_data.get('status')
-        instance.category = validated_data.get('category')
-        instance.main_picture = validated_data.get('main_picture')
-
-        # delete existing steps and ingredient connections from DB
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        RecipeStep.objects.filter(recipe=instance).delete()
-
-        # create ingedients and connections
-        recipe_ingredients = [
-            RecipeIngredient(
-                recipe=instance,
-                ingredient=Ingredient.objects.get(
-                    name=ingredient_dict['ingredient']
-                ),
-                unit=ingredient_dict["unit"],
-                amount=ingredient_dict["amount"],
-            ) for ingredient_dict in ingredients_list
+        changed_fields = [
+            field for field, value in validated_data.items()
+            if getattr(instance, field) != value
         ]
+        for field in changed_fields:
+            setattr(instance, field, validated_data[field])
+        if changed_fields:
+            instance.save(update_fields=changed_fields + ['time_updated'])
+        promotion.keep(self.images(validated_data, steps_list))
+
+        parts_changed = self.update_ingredients(instance, ingredients_list)
+        parts_changed |= self.update_steps(instance, steps_list)
+        if parts_changed:
+            # bulk writes send no signals
+            recipe_pk = instance.pk
+            transaction.on_commit(lambda: recipe_cache.invalidate(recipe_pk))
+
+        # the parts are loaded anew when the recipe is rendered
+        instance._prefetched_objects_cache = {}
+        return instance
+
+    def update_ingredients(self, recipe, ingredients_list):
+        """
+        Matches the stored ingredients to the given ones by ingredient
+        """
+        stored = {}
+        for row in recipe.ingredients.all():
+            stored.setdefault(row.ingredient_id, []).append(row)
+
+        changed, added = [], []
+        for ingredient_dict in ingredients_list:
+            rows = stored.get(ingredient_dict['ingredient_id'])
+            if not rows:
+                added.append(self.new_ingredient(recipe, ingredient_dict))
+                continue
+            row = rows.pop(0)
+            if (row.unit, row.amount) != (ingredient_dict['unit'], ingredient_dict['amount']):
+                row.unit = ingredient_dict['unit']
+                row.amount = ingredient_dict['amount']
+                changed.append(row)
+
+        removed = [row.pk for rows in stored.values() for row in rows]
+        return apply_changes(RecipeIngredient, changed, ('unit', 'amount'), added, removed)
+
+    def update_steps(self, recipe, steps_list):
+        """
+        Matches the stored steps to the given ones by position
+        """
+        stored = sorted(recipe.steps.all(), key=attrgetter('id'))
+
+        changed = []
+        for row, step_dict in zip(stored, steps_list):
+            image = step_dict.get('image')
+            if (row.text, row.image_id) != (step_dict['text'], image and image.pk):
+                row.text = step_dict['text']
+                row.image = image
+                changed.append(row)
+
+        # new steps get greater ids, so they stay after the kept ones
+        added = [self.new_step(recipe, step_dict) for step_dict in steps_list[len(stored):]]
+        removed = [row.pk for row in stored[len(steps_list):]]
+        return apply_changes(RecipeStep, changed, ('text', 'image'), added, removed)
+
+    @staticmethod
+    def new_ingredient(recipe, ingredient_dict):
+        return RecipeIngredient(
+            recipe=recipe,
+            ingredient_id=ingredient_dict['ingredient_id'],
+            unit=ingredient_dict['unit'],
+            amount=ingredient_dict['amount'],
+        )
 
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
-        instance.ingredients.set(recipe_ingredients)
+    @staticmethod
+    def new_step(recipe, step_dict):
+        return RecipeStep(
+            recipe=recipe,
+            text=step_dict['text'],
+            image=step_dict.get('image'),
+        )
 
-        # create steps
-        steps_in_recipe = [
-            RecipeStep(
-                text=step_dict['text'],
-                recipe=instance,
-                image=step_dict['image']
-            ) for step_dict in steps_list
+    @staticmethod
+    def images(validated_data, steps_list):
+        """
+        Returns the images shown by the recipe being saved
+        """
+        return [validated_data['main_picture']] + [
+            step_dict['image'] for step_dict in steps_list if step_dict.get('image')
         ]
 
-        RecipeStep.objects.bulk_create(steps_in_recipe)
-        instance.steps.set(steps_in_recipe)
+    def to_representation(self, instance):
+        # recipes just written come without their parts
+        if 'steps' not in getattr(instance, '_prefetched_objects_cache', {}):
+            prefetch_related_objects([instance], *self.part_prefetches())
+        return super().to_representation(instance)
 
-        return instance
+
+def apply_changes(model, changed, fields, added, removed):
+    """
+    Writes the difference of a recipe part in bulk, returns whether there was any
+    """
+    if removed:
+        model.objects.filter(pk__in=removed).delete()
+    if changed:
+        model.objects.bulk_update(changed, fields)
+    if added:
+        model.objects.bulk_create(added)
+    return bool(removed or changed or added)
+
+
+class RecipeExportSerializer(RecipeDetailedSerializer):
+    """
+    Serializer for recipes in exports - identified and timestamped
+    """
+
+    class Meta(RecipeDetailedSerializer.Meta):
+        fields = ('id', ) + RecipeDetailedSerializer.Meta.fields + ('time_updated', )
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -263,8 +511,6 @@ class CommentSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
-        validated_data['recipe'] = get_object_or_404(
-            Recipe,
-            pk=self.context['recipe_pk'],
-        )
-        return super().create(validated_data)
\ No newline at end of file
+        # looked up by the view already
+        validated_data['recipe'] = self.context['recipe']
+        return super().create(validated_data)
@@ -1,34 +1,84 @@
-import boto3
-from django.conf import settings
-from django.db.models.signals import pre_delete
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
-from .models import Image
+from . import cache as recipe_cache
+from . import ingredients as ingredient_catalogue
+from . import storage_deletes
+from .models import (Comment, Image, Ingredient, Recipe, RecipeIngredient,
+                     RecipeStep)
+from .storage import directory, stored_names
 
 
 @receiver(pre_delete, sender=Image)
 def image_file_delete(sender, instance, **kwargs):
     """
     Reacts on deleting the record in Image DB and deletes
-    corresponding file from cloud storage.
+    corresponding files from cloud storage once the deletion is committed.
     """
+    # get file key depending on where the files are
+    storage_deletes.delete_later(
+        directory(instance) + name for name in stored_names(instance)
+    )
+
+
+def invalidate_recipe_cache(*pks):
+    """
+    Drops cached payloads once the current transaction is committed
+    """
+    transaction.on_commit(lambda: recipe_cache.invalidate(*pks))
 
-    s3 = boto3.resource(
-        's3',
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_REGION,
-        endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+
+def image_recipe_pks(image):
+    return list(
+        Recipe.objects
+        .filter(Q(main_picture=image) | Q(steps__image=image))
+        .values_list('pk', flat=True)
+        .distinct()
     )
 
-    bucket = s3.Bucket(settings.AWS_STORAGE_BUCKET_NAME)
 
-    # get file key depending on its status in DB
-    if instance.is_temporary:
-        directory = settings.AWS_LOCATION
-    else:
-        directory = settings.AWS_PERMANENT_DIRECTORY
+@receiver([post_save, post_delete], sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    invalidate_recipe_cache(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=RecipeStep)
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def recipe_part_changed(sender, instance, **kwargs):
+    invalidate_recipe_cache(instance.recipe_id)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    """
+    List pages show the number of comments of every recipe
+    """
+    transaction.on_commit(recipe_cache.invalidate_lists)
+
+
+@receiver(pre_delete, sender=Image)
+def image_collect_recipes(sender, instance, **kwargs):
+    """
+    Remembers the recipes showing the image while the references still exist
+    """
+    instance._recipe_pks = image_recipe_pks(instance)
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+def image_changed(sender, instance, created=False, **kwargs):
+    if created:
+        # a new image is not shown anywhere yet
+        return
+    pks = getattr(instance, '_recipe_pks', None)
+    if pks is None:
+        pks = image_recipe_pks(instance)
+    if pks:
+        invalidate_recipe_cache(*pks)
 
-    key = directory + instance.image.name
 
-    bucket.delete_objects(Delete={'Objects': [{'Key': key}]})
\ No newline at end of file
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    transaction.on_commit(ingredient_catalogue.invalidate)
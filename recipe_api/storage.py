@@ -0,0 +1,136 @@
+"""
+Mapping between images and their URLs in the cloud storage.
+
+Every image is served from <endpoint>/<bucket>/<directory><file name>, the
+directory being the temporary one (AWS_LOCATION) until the image is promoted
+to the permanent one. URLs are built from these prefixes instead of asking
+the storage backend for each image, and URLs sent by clients are parsed
+with a pattern compiled once. Images referenced by URL in a payload are
+looked up with a single query.
+"""
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+
+from .models import Image
+
+BUCKET_URL = f'{settings.AWS_S3_ENDPOINT_URL}/{settings.AWS_STORAGE_BUCKET_NAME}/'
+URL_PREFIX = BUCKET_URL + settings.AWS_LOCATION
+PERMANENT_URL_PREFIX = BUCKET_URL + (settings.AWS_PERMANENT_DIRECTORY or '')
+URL_PATTERN = re.compile(
+    f'(?:{re.escape(URL_PREFIX)}|{re.escape(PERMANENT_URL_PREFIX)}).+'
+)
+
+DOES_NOT_EXIST = 'Such file does not exist'
+NOT_READY = 'The image is not processed yet'
+
+
+class PendingImage:
+    """
+    Image given by URL, not looked up yet
+    """
+    __slots__ = ('name', )
+
+    def __init__(self, name):
+        self.name = name
+
+
+def image_url(name, promoted=False):
+    return (PERMANENT_URL_PREFIX if promoted else URL_PREFIX) + quote(name)
+
+
+def directory(image):
+    """
+    Returns the directory of the stored files of the image
+    """
+    return settings.AWS_PERMANENT_DIRECTORY if image.is_promoted else settings.AWS_LOCATION
+
+
+def rendition_urls(image, name):
+    """
+    Returns the URLs of a rendition of the image by format, with its size.
+    Images stored before renditions existed only have their main file.
+    """
+    rendition = image.renditions.get(name)
+    if rendition is None:
+        return {'jpeg': image_url(image.image.name, image.is_promoted)}
+    return {
+        key: value if key in ('width', 'height') else image_url(value, image.is_promoted)
+        for key, value in rendition.items()
+    }
+
+
+def stored_names(image):
+    """
+    Returns the names of all stored files of the image
+    """
+    names = [image.image.name] if image.image else []
+    for rendition in image.renditions.values():
+        names += [
+            value for key, value in rendition.items()
+            if key not in ('width', 'height') and value not in names
+        ]
+    return names
+
+
+def file_name(url):
+    """
+    Returns the file name of an image URL, None if it is not a storage URL.
+    URLs in either directory are accepted, as clients may send back the URL
+    of an image promoted in the meantime.
+    """
+    if not URL_PATTERN.fullmatch(url):
+        return None
+    return url.split('/')[-1]
+
+
+def resolve_images(data):
+    """
+    Replaces every PendingImage in (nested) validated data with its Image.
+    Returns the data and the errors shaped like it, None if there are none.
+    """
+    names = {image.name for image in _pending(data)}
+    if not names:
+        return data, None
+    images = {
+        image.image.name: image
+        for image in Image.objects.filter(image__in=names)
+    }
+    return _replace(data, images)
+
+
+def _pending(value):
+    if isinstance(value, PendingImage):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _pending(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _pending(item)
+
+
+def _replace(value, images):
+    if isinstance(value, PendingImage):
+        image = images.get(value.name)
+        if image is None:
+            return None, [DOES_NOT_EXIST]
+        if image.status != Image.Status.READY:
+            return None, [NOT_READY]
+        return image, None
+
+    if isinstance(value, dict):
+        result, errors = {}, {}
+        for key, item in value.items():
+            result[key], error = _replace(item, images)
+            if error:
+                errors[key] = error
+        return result, errors or None
+
+    if isinstance(value, list):
+        replaced = [_replace(item, images) for item in value]
+        errors = [error or {} for _, error in replaced]
+        return [item for item, _ in replaced], errors if any(errors) else None
+
+    return value, None
@@ -0,0 +1,133 @@
+"""
+Deletion of stored files, deferred until the deleting transaction commits.
+
+Keys are stored as PendingStorageDelete rows in the deleting transaction
+and queued once it commits, so files of rows whose deletion is rolled back
+are never touched, and no network call is made while the transaction holds
+its locks. A background thread drains the queue, coalescing the keys of
+many deletes into DeleteObjects requests of up to BATCH_SIZE keys sent
+through the shared S3 client, and removes the rows of the deleted files.
+Keys that could not be deleted, or were lost with the queue when the
+process exited, keep their rows for `retry_storage_deletes`.
+"""
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+
+from myproject.storage_backends import s3_client
+
+from .models import PendingStorageDelete
+
+logger = logging.getLogger(__name__)
+
+# max keys of a DeleteObjects request
+BATCH_SIZE = 1000
+# seconds a queued key waits for others to join its request
+COALESCE_DELAY = 0.2
+
+_queue = queue.Queue()
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def delete_later(keys):
+    """
+    Deletes the stored files with the given keys once the current
+    transaction commits (right away outside of a transaction)
+    """
+    keys = list(keys)
+    if keys:
+        PendingStorageDelete.objects.bulk_create(
+            [PendingStorageDelete(key=key, attempts=0) for key in keys],
+            ignore_conflicts=True,
+        )
+        transaction.on_commit(lambda: _enqueue(keys))
+
+
+def _enqueue(keys):
+    global _thread
+
+    if _thread is None or not _thread.is_alive():
+        with _thread_lock:
+            if _thread is None or not _thread.is_alive():
+                _thread = threading.Thread(
+                    target=_drain, name='storage-deletes', daemon=True
+                )
+                _thread.start()
+    for key in keys:
+        _queue.put(key)
+
+
+def _drain():
+    while True:
+        keys = [_queue.get()]
+        try:
+            while len(keys) < BATCH_SIZE:
+                keys.append(_queue.get(timeout=COALESCE_DELAY))
+        except queue.Empty:
+            pass
+        try:
+            retry(keys)
+        except Exception:
+            logger.exception('Deleting %d stored files failed', len(keys))
+        finally:
+            # failures are written with the connection of this thread
+            connections.close_all()
+            for _ in keys:
+                _queue.task_done()
+
+
+@atexit.register
+def flush():
+    """
+    Waits until every queued key has been handled, e.g. before a
+    management command exits
+    """
+    if _thread is not None and _thread.is_alive():
+        _queue.join()
+
+
+def delete(keys):
+    """
+    Deletes the files in batches, recording the keys that failed.
+    Returns the keys that failed, with their errors.
+    """
+    failed = {}
+    for start in range(0, len(keys), BATCH_SIZE):
+        batch = keys[start:start + BATCH_SIZE]
+        try:
+            response = s3_client().delete_objects(
+                Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True},
+            )
+        except Exception as error:
+            failed.update((key, str(error)) for key in batch)
+            continue
+        # deleting a missing key is no error
+        failed.update(
+            (error['Key'], f"{error.get('Code')}: {error.get('Message')}")
+            for error in response.get('Errors', [])
+        )
+
+    if failed:
+        PendingStorageDelete.objects.bulk_create(
+            [PendingStorageDelete(key=key, error=error[:1000]) for key, error in failed.items()],
+            ignore_conflicts=True,
+        )
+    return failed
+
+
+def retry(keys):
+    """
+    Deletes the files of the given recorded keys, dropping the rows of
+    those deleted. Returns the numbers of deleted and failed keys.
+    """
+    failed = delete(keys)
+    PendingStorageDelete.objects.filter(key__in=failed).update(attempts=F('attempts') + 1)
+    PendingStorageDelete.objects.filter(key__in=keys).exclude(key__in=failed).delete()
+    return len(keys) - len(failed), len(failed)
@@ -0,0 +1,296 @@
+"""
+Live comment streams of recipes, served as Server-Sent Events over ASGI.
+
+Every process holds one database connection listening to the
+recipe_comments channel (see migration 0024), registered with the event
+loop. Notifications for recipes somebody is subscribed to are collected,
+their comments are loaded with one query per batch and rendered once, then
+fanned out to the queues of the subscribers. A client is a coroutine and a
+small queue, so a worker holds thousands of idle streams without a thread
+for each.
+
+A client that reconnects with Last-Event-ID gets the comments it missed.
+A client too slow to keep up is disconnected and catches up the same way.
+Notifications sent while the listening connection was lost are gone, so
+once it is open again every client gets a `resync` event, on which it
+loads the comments anew.
+"""
+import asyncio
+import json
+import re
+from collections import defaultdict
+
+import psycopg2
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connections
+from djangorestframework_camel_case.render import CamelCaseJSONRenderer
+
+from .models import Comment, Recipe
+from .serializers import CommentSerializer
+
+CHANNEL = 'recipe_comments'
+PATH = re.compile(r'/api/recipes/(?P<pk>\d+)/feedbacks/stream/')
+# seconds between comment lines keeping idle connections open
+HEARTBEAT = 15
+# seconds before a lost listening connection is opened again
+RECONNECT_DELAY = 3
+# events waiting for a client before it is disconnected
+MAX_PENDING = 100
+# comments sent at most to a client coming back with Last-Event-ID
+MAX_REPLAY = 100
+# queued for the subscribers once notifications may have been missed
+RESYNC = object()
+
+
+class Subscription:
+    __slots__ = ('recipe_pk', 'queue', 'overflowed')
+
+    def __init__(self, recipe_pk):
+        self.recipe_pk = recipe_pk
+        self.queue = asyncio.Queue(MAX_PENDING)
+        self.overflowed = False
+
+
+class CommentHub:
+    """
+    The listening connection of the process and the subscribers to it
+    """
+
+    def __init__(self):
+        self.subscriptions = defaultdict(set)
+        self.connection = None
+        self.fileno = None
+        # the single task opening the connection, while it runs
+        self.listening = None
+        # notifications may have been missed since the last connection
+        self.lost = False
+        self.pending = set()
+        self.dispatching = False
+
+    def subscribe(self, recipe_pk):
+        subscription = Subscription(recipe_pk)
+        self.subscriptions[recipe_pk].add(subscription)
+        self.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscribers = self.subscriptions.get(subscription.recipe_pk)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.subscriptions[subscription.recipe_pk]
+
+    def start(self):
+        if self.connection is None and self.listening is None:
+            self.listening = asyncio.get_running_loop().create_task(self.listen())
+
+    async def listen(self):
+        """
+        Opens the listening connection, in a thread as connecting blocks,
+        trying again every RECONNECT_DELAY seconds while anybody is subscribed
+        """
+        loop = asyncio.get_running_loop()
+        params = connections['default'].get_connection_params()
+        try:
+            # with nobody subscribed the next subscriber connects
+            while self.subscriptions:
+                try:
+                    connection = await loop.run_in_executor(None, open_listener, params)
+                except psycopg2.Error:
+                    self.lost = True
+                    await asyncio.sleep(RECONNECT_DELAY)
+                    continue
+                self.connection = connection
+                self.fileno = connection.fileno()
+                loop.add_reader(self.fileno, self.read)
+                if self.lost:
+                    self.lost = False
+                    self.resync()
+                return
+        finally:
+            self.listening = None
+
+    async def connected(self):
+        if self.listening is not None:
+            # shared by the subscribers, none of them may cancel it
+            await asyncio.shield(self.listening)
+
+    def reconnect(self):
+        if self.connection is not None:
+            # the connection may be broken already, the fd is kept
+            asyncio.get_running_loop().remove_reader(self.fileno)
+            self.connection.close()
+            self.connection = None
+            self.lost = True
+        self.start()
+
+    def resync(self):
+        for subscribers in list(self.subscriptions.values()):
+            for subscription in list(subscribers):
+                self.deliver(subscription, RESYNC)
+
+    def deliver(self, subscription, event):
+        try:
+            subscription.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            subscription.overflowed = True
+            self.unsubscribe(subscription)
+
+    def read(self):
+        connection = self.connection
+        try:
+            connection.poll()
+        except psycopg2.Error:
+            self.reconnect()
+            return
+        while connection.notifies:
+            payload = json.loads(connection.notifies.pop(0).payload)
+            if payload['recipe'] in self.subscriptions:
+                self.pending.add(payload['id'])
+        if self.pending and not self.dispatching:
+            self.dispatching = True
+            asyncio.get_running_loop().create_task(self.dispatch())
+
+    async def dispatch(self):
+        try:
+            while self.pending:
+                pks, self.pending = self.pending, set()
+                for recipe_pk, event in await load_events(pks=pks):
+                    for subscription in list(self.subscriptions.get(recipe_pk, ())):
+                        self.deliver(subscription, event)
+        finally:
+            self.dispatching = False
+
+
+hub = CommentHub()
+
+
+def open_listener(params):
+    """
+    Opens a psycopg2 connection of its own, outside of Django's per-thread
+    ones, listening to the channel
+    """
+    connection = psycopg2.connect(**params)
+    try:
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {CHANNEL}')
+    except psycopg2.Error:
+        connection.close()
+        raise
+    return connection
+
+
+@sync_to_async
+def load_events(pks=None, recipe_pk=None, after=None):
+    """
+    Returns (recipe pk, (comment pk, rendered comment)) for the comments
+    with the given pks, or those of a recipe after the given comment pk
+    """
+    close_old_connections()
+    comments = Comment.objects.select_related('user').order_by('id')
+    if pks is not None:
+        comments = comments.filter(pk__in=pks)
+    else:
+        comments = comments.filter(recipe_id=recipe_pk, pk__gt=after)[:MAX_REPLAY]
+    renderer = CamelCaseJSONRenderer()
+    return [
+        (comment.recipe_id, (comment.pk, renderer.render(CommentSerializer(comment).data)))
+        for comment in comments
+    ]
+
+
+@sync_to_async
+def recipe_exists(pk):
+    close_old_connections()
+    return Recipe.objects.filter(pk=pk).exists()
+
+
+async def comment_stream(scope, receive, send, recipe_pk):
+    """
+    ASGI application streaming the new comments of a recipe
+    """
+    if scope['method'] != 'GET':
+        await respond(send, 405, {'detail': f"Method \"{scope['method']}\" not allowed."})
+        return
+    if not await recipe_exists(recipe_pk):
+        await respond(send, 404, {'detail': 'Not found.'})
+        return
+
+    headers = dict(scope['headers'])
+    try:
+        last_pk = int(headers.get(b'last-event-id', b''))
+    except ValueError:
+        last_pk = None
+
+    # subscribed and listening before the replay, so that nothing falls in between
+    subscription = hub.subscribe(recipe_pk)
+    stream = asyncio.ensure_future(
+        send_events(send, subscription, recipe_pk, last_pk)
+    )
+    disconnect = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        await asyncio.wait({stream, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        stream.cancel()
+        disconnect.cancel()
+        hub.unsubscribe(subscription)
+
+
+async def send_events(send, subscription, recipe_pk, last_pk):
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            # no buffering by a proxy in front
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+    await send_chunk(send, b'retry: 3000\n\n')
+
+    # nothing committed after the replay may be missed
+    await hub.connected()
+    if last_pk is not None:
+        for _, event in await load_events(recipe_pk=recipe_pk, after=last_pk):
+            last_pk = await send_event(send, event)
+
+    while not (subscription.overflowed and subscription.queue.empty()):
+        try:
+            event = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT)
+        except asyncio.TimeoutError:
+            await send_chunk(send, b': heartbeat\n\n')
+            continue
+        if event is RESYNC:
+            await send_chunk(send, b'event: resync\ndata: {}\n\n')
+            continue
+        # the replay may have sent it already
+        if last_pk is None or event[0] > last_pk:
+            last_pk = await send_event(send, event)
+
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def send_event(send, event):
+    pk, data = event
+    await send_chunk(send, b'id: %d\nevent: comment\ndata: %s\n\n' % (pk, data))
+    return pk
+
+
+async def send_chunk(send, body):
+    await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def respond(send, status, data):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps(data).encode()})
@@ -0,0 +1,218 @@
+"""
+Benchmarks of the API endpoints at several data sizes (pytest-benchmark).
+
+Every endpoint is timed through its view, with caches off so that the
+database path is measured, and uploads going to a local directory. Besides
+the timings, each benchmark records the p95/p99 latency, the number of SQL
+queries of a request and the peak Python memory in its extra info.
+
+Save a baseline and compare a later run against it with
+
+    pytest recipe_api/test_benchmarks.py --benchmark-autosave
+    pytest recipe_api/test_benchmarks.py --benchmark-compare --benchmark-compare-fail=median:25%
+
+Skip them in a quick run with --benchmark-skip.
+"""
+import statistics
+import time
+import tracemalloc
+from io import BytesIO
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from PIL import Image as PillowImage
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from recipe_api.conftest import STEPS_PER_RECIPE
+from recipe_api.models import Image, Recipe, RecipeIngredient
+from recipe_api.storage import image_url
+from recipe_api.views import CommentsViewSet, ImageViewSet, RecipeViewSet
+
+SIZES = (10, 100, 1000)
+ROUNDS = 30
+
+factory = APIRequestFactory()
+
+
+@pytest.fixture(params=SIZES, ids=lambda size: f'{size}-recipes')
+def newest_recipe(request, make_recipes, no_cache, local_storage):
+    """
+    The newest of `size` published recipes, the one with comments
+    """
+    return make_recipes(request.param)[-1]
+
+
+def measure(benchmark, viewset, actions, build_request, **kwargs):
+    """
+    Benchmarks the view of the actions with requests from `build_request`,
+    built anew for every round
+    """
+    view = viewset.as_view(actions)
+
+    def call(request):
+        response = view(request, **kwargs)
+        response.render()
+        assert response.status_code < 400, response.content[:500]
+
+    # warm up, and count the queries of a single request
+    with CaptureQueriesContext(connection) as context:
+        call(build_request())
+
+    # tracing slows the code down, so memory is measured on its own
+    tracemalloc.start()
+    call(build_request())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    benchmark.pedantic(call, setup=lambda: ((build_request(),), {}), rounds=ROUNDS)
+
+    percentiles = statistics.quantiles(benchmark.stats.stats.data, n=100, method='inclusive')
+    benchmark.extra_info.update({
+        'p95_ms': round(percentiles[94] * 1000, 3),
+        'p99_ms': round(percentiles[98] * 1000, 3),
+        'queries': len(context.captured_queries),
+        'peak_kib': round(peak / 1024, 1),
+    })
+
+
+def authenticated(request, user):
+    force_authenticate(request, user=user)
+    return request
+
+
+def png(size=(1200, 800)):
+    """
+    Returns the content of a generated PNG picture
+    """
+    content = BytesIO()
+    PillowImage.new('RGB', size, (200, 120, 40)).save(content, format='PNG')
+    return content.getvalue()
+
+
+def recipe_payload(ingredients):
+    # every recipe needs its own uploaded pictures
+    main_picture, step_picture = Image.objects.bulk_create([
+        Image(image=f'upload-{time.perf_counter_ns()}-{index}.jpeg')
+        for index in range(2)
+    ])
+    return {
+        'name': 'Benchmark recipe',
+        'category': Recipe.Category.SOUP,
+        'is_spicy': False,
+        'is_vegetarian': True,
+        'servings_number': 4,
+        'time_cooking': 30,
+        'time_preparing': 15,
+        'main_picture': image_url(main_picture.image.name),
+        'ingredients': [
+            {'ingredient': ingredient.name, 'unit': RecipeIngredient.UnitOptions.GRAM, 'amount': '1.50'}
+            for ingredient in ingredients
+        ],
+        'steps': [
+            {'text': f'Step {index}', 'image': image_url(step_picture.image.name)}
+            for index in range(STEPS_PER_RECIPE)
+        ],
+    }
+
+
+def edit_payload(recipe):
+    """
+    The recipe as it is, with the text of its last step edited
+    """
+    ingredients = list(recipe.ingredients.select_related('ingredient'))
+    steps = list(recipe.steps.select_related('image').order_by('id'))
+    return {
+        'name': recipe.name,
+        'category': recipe.category,
+        'is_spicy': recipe.is_spicy,
+        'is_vegetarian': recipe.is_vegetarian,
+        'servings_number': recipe.servings_number,
+        'time_cooking': recipe.time_cooking,
+        'time_preparing': recipe.time_preparing,
+        'main_picture': image_url(recipe.main_picture.image.name, recipe.main_picture.is_promoted),
+        'ingredients': [
+            {'ingredient': row.ingredient.name, 'unit': row.unit, 'amount': str(row.amount)}
+            for row in ingredients
+        ],
+        'steps': [
+            {'text': step.text, **({'image': image_url(step.image.image.name)} if step.image else {})}
+            for step in steps[:-1]
+        ] + [{'text': f'Edited at {time.perf_counter_ns()}'}],
+    }
+
+
+@pytest.mark.benchmark(group='recipes.list')
+def test_recipes_list(benchmark, newest_recipe):
+    measure(benchmark, RecipeViewSet, {'get': 'list'}, lambda: factory.get('/api/recipes/'))
+
+
+@pytest.mark.benchmark(group='recipes.retrieve')
+def test_recipes_retrieve(benchmark, newest_recipe):
+    measure(
+        benchmark, RecipeViewSet, {'get': 'retrieve'},
+        lambda: factory.get(f'/api/recipes/{newest_recipe.pk}/'),
+        pk=newest_recipe.pk,
+    )
+
+
+@pytest.mark.benchmark(group='recipes.create')
+def test_recipes_create(benchmark, newest_recipe, ingredients):
+    measure(
+        benchmark, RecipeViewSet, {'post': 'create'},
+        lambda: authenticated(
+            factory.post('/api/recipes/', recipe_payload(ingredients), format='json'),
+            newest_recipe.author,
+        ),
+    )
+
+
+@pytest.mark.benchmark(group='recipes.update')
+def test_recipes_update(benchmark, newest_recipe):
+    url = f'/api/recipes/{newest_recipe.pk}/'
+    measure(
+        benchmark, RecipeViewSet, {'put': 'update'},
+        lambda: authenticated(
+            factory.put(url, edit_payload(newest_recipe), format='json'),
+            newest_recipe.author,
+        ),
+        pk=newest_recipe.pk,
+    )
+
+
+@pytest.mark.benchmark(group='comments.list')
+def test_comments_list(benchmark, newest_recipe):
+    measure(
+        benchmark, CommentsViewSet, {'get': 'list'},
+        lambda: factory.get(f'/api/recipes/{newest_recipe.pk}/feedbacks/'),
+        pk=newest_recipe.pk,
+    )
+
+
+@pytest.mark.benchmark(group='comments.create')
+def test_comments_create(benchmark, newest_recipe):
+    url = f'/api/recipes/{newest_recipe.pk}/feedbacks/'
+    measure(
+        benchmark, CommentsViewSet, {'post': 'create'},
+        lambda: authenticated(
+            factory.post(url, {'text': 'Tasty'}, format='json'),
+            newest_recipe.author,
+        ),
+        pk=newest_recipe.pk,
+    )
+
+
+@pytest.mark.benchmark(group='images.upload')
+def test_images_upload(benchmark, newest_recipe):
+    measure(
+        benchmark, ImageViewSet, {'post': 'create'},
+        lambda: authenticated(
+            factory.post(
+                '/api/upload-image/',
+                {'image': SimpleUploadedFile('picture.png', png(), content_type='image/png')},
+                format='multipart',
+            ),
+            newest_recipe.author,
+        ),
+    )
@@ -1,3 +1,445 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+import pytest
+from asgiref.sync import async_to_sync
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+
+from recipe_api import cache as recipe_cache
+from recipe_api import image_processing, storage_deletes, streams, uploads
+from recipe_api.checks import check_recipe_cache
+from recipe_api.models import (Comment, Image, PendingStorageDelete, Recipe,
+                               RecipeSummary)
+from recipe_api.export import EXPORT_OVERLAP
+from recipe_api.storage import image_url
+from recipe_api.views import (CommentsViewSet, ExportRateThrottle,
+                              RecipeViewSet)
+
+# (viewset, action, URL and view kwargs of the recipe)
+READ_ACTIONS = [
+    (RecipeViewSet, 'list', lambda recipe: ('/api/recipes/', {})),
+    (RecipeViewSet, 'retrieve', lambda recipe: (f'/api/recipes/{recipe.pk}/', {'pk': recipe.pk})),
+    (CommentsViewSet, 'list', lambda recipe: (f'/api/recipes/{recipe.pk}/feedbacks/', {'pk': recipe.pk})),
+]
+
+
+def read_view(viewset, action, run_async):
+    if run_async:
+        # run in this thread, the async ORM included
+        return async_to_sync(viewset.as_async_view({'get': action}))
+    return viewset.as_view({'get': action})
+
+
+@pytest.mark.parametrize('run_async', [False, True], ids=['sync', 'async'])
+@pytest.mark.parametrize(
+    'viewset, action, target', READ_ACTIONS,
+    ids=[f'{viewset.__name__}.{action}' for viewset, action, _ in READ_ACTIONS],
+)
+def test_query_budget(viewset, action, target, run_async, recipe, no_cache,
+                      django_assert_max_num_queries):
+    if run_async and action not in viewset.async_actions:
+        pytest.skip(f'{viewset.__name__}.{action} has no async view')
+    url, kwargs = target(recipe)
+    view = read_view(viewset, action, run_async)
+
+    with django_assert_max_num_queries(viewset.query_budgets[action]):
+        response = view(APIRequestFactory().get(url), **kwargs)
+        response.render()
+
+    assert response.status_code == 200
+
+
+def test_comment_create_query_budget(recipe, no_cache, django_assert_max_num_queries):
+    request = APIRequestFactory().post(f'/api/recipes/{recipe.pk}/feedbacks/', {'text': 'Tasty'}, format='json')
+    force_authenticate(request, user=recipe.author)
+
+    with django_assert_max_num_queries(CommentsViewSet.query_budgets['create']):
+        response = CommentsViewSet.as_view({'post': 'create'})(request, pk=recipe.pk)
+
+    assert response.status_code == 201
+
+
+@pytest.mark.parametrize('run_async', [False, True], ids=['sync', 'async'])
+def test_comment_feed_of_missing_recipe(run_async, recipe, no_cache):
+    view = read_view(CommentsViewSet, 'list', run_async)
+    missing_pk = recipe.pk + 1000
+
+    response = view(APIRequestFactory().get(f'/api/recipes/{missing_pk}/feedbacks/'), pk=missing_pk)
+
+    assert response.status_code == 404
+
+
+def test_comment_total_follows_inserts_and_deletes(recipe, no_cache):
+    client = APIClient()
+    client.force_authenticate(recipe.author)
+    for text in ('First', 'Second'):
+        client.post(f'/api/recipes/{recipe.pk}/feedbacks/', {'text': text}, format='json')
+    Comment.objects.filter(pk__in=Comment.objects.filter(recipe=recipe).values('pk')[:5]).delete()
+
+    response = client.get(f'/api/recipes/{recipe.pk}/feedbacks/')
+
+    assert response.json()['total'] == Comment.objects.filter(recipe=recipe).count() == 17
+
+
+def test_comment_feed_pages_by_cursor(recipe, no_cache):
+    client = APIClient()
+    url, texts, pages = f'/api/recipes/{recipe.pk}/feedbacks/?page_size=3', [], []
+    while url:
+        page = client.get(url).json()
+        pages.append(page)
+        texts += [comment['text'] for comment in page['results']]
+        url = page['links']['next']
+
+    assert texts == [f'Comment {index}' for index in reversed(range(20))]
+    previous = client.get(pages[-1]['links']['previous']).json()
+    assert previous['results'] == pages[-2]['results']
+
+
+def test_recipe_facets_leave_out_their_own_filter(make_recipes, no_cache):
+    make_recipes(30)
+    published = Recipe.objects.filter(status=Recipe.Status.PUBLISHED)
+
+    response = APIClient().get('/api/recipes/', {'facets': 'true', 'is_spicy': 'true'})
+
+    facets = response.json()['facets']
+    assert facets['isSpicy'] == {
+        'true': published.filter(is_spicy=True).count(),
+        'false': published.filter(is_spicy=False).count(),
+    }
+    assert facets['category'] == {
+        category: published.filter(is_spicy=True, category=category).count()
+        for category in Recipe.Category.values
+    }
+
+
+def test_recipe_update_writes_only_the_changes(recipe, no_cache):
+    client = APIClient()
+    client.force_authenticate(recipe.author)
+    ingredients = list(recipe.ingredients.select_related('ingredient').order_by('id'))
+    steps = list(recipe.steps.order_by('id'))
+
+    response = client.put(f'/api/recipes/{recipe.pk}/', {
+        'name': recipe.name,
+        'category': recipe.category,
+        'is_spicy': recipe.is_spicy,
+        'is_vegetarian': recipe.is_vegetarian,
+        'servings_number': recipe.servings_number,
+        'time_cooking': recipe.time_cooking + 5,
+        'time_preparing': recipe.time_preparing,
+        'main_picture': image_url(recipe.main_picture.image.name, recipe.main_picture.is_promoted),
+        # the first amount changed, the last ingredient left out
+        'ingredients': [
+            {'ingredient': row.ingredient.name, 'unit': row.unit, 'amount': str(row.amount + (row is ingredients[0]))}
+            for row in ingredients[:-1]
+        ],
+        # the last step edited
+        'steps': [{'text': step.text} for step in steps[:-1]] + [{'text': 'Serve'}],
+    }, format='json')
+
+    assert response.status_code == 200
+    assert list(recipe.ingredients.order_by('id').values_list('id', 'amount')) == [
+        (ingredients[0].pk, ingredients[0].amount + 1),
+        *((row.pk, row.amount) for row in ingredients[1:-1]),
+    ]
+    assert list(recipe.steps.order_by('id').values_list('id', 'text')) == [
+        *((step.pk, step.text) for step in steps[:-1]),
+        (steps[-1].pk, 'Serve'),
+    ]
+    # kept by the triggers
+    summary = RecipeSummary.objects.get(recipe=recipe)
+    assert (summary.ingredients_count, summary.steps_count, summary.total_time) == (
+        len(ingredients) - 1, len(steps), recipe.time_cooking + 5 + recipe.time_preparing,
+    )
+
+
+def test_comment_refreshes_cached_list_pages(recipe, django_capture_on_commit_callbacks):
+    client = APIClient()
+    client.force_authenticate(recipe.author)
+
+    def comments_count():
+        # the recipe is the newest one
+        response = client.get('/api/recipes/')
+        newest = response.json()['results'][0]
+        assert newest['name'] == recipe.name
+        return response['X-Cache'], newest['commentsCount']
+
+    _, count = comments_count()
+    assert comments_count() == ('HIT', count)
+    with django_capture_on_commit_callbacks(execute=True):
+        client.post(f'/api/recipes/{recipe.pk}/feedbacks/', {'text': 'Tasty'}, format='json')
+
+    assert comments_count() == ('MISS', count + 1)
+
+
+def test_detail_cached_under_recipe_id(recipe):
+    response = APIClient().get(f'/api/recipes/0{recipe.pk}/')
+
+    assert response.status_code == 200
+    assert recipe_cache.get_detail(recipe.pk) is not None
+
+
+def test_processed_picture_refreshes_cached_recipe(recipe, local_storage):
+    Image.objects.filter(pk=recipe.main_picture_id).update(status=Image.Status.PROCESSING)
+    APIClient().get(f'/api/recipes/{recipe.pk}/')
+    assert recipe_cache.get_detail(recipe.pk) is not None
+
+    image_processing.complete(Image.objects.get(pk=recipe.main_picture_id), {
+        'medium': {'width': 1, 'height': 1, 'files': {'jpeg': b'jpeg'}},
+    })
+
+    assert recipe_cache.get_detail(recipe.pk) is None
+
+
+@pytest.mark.parametrize('backend, errors', [
+    ('django.core.cache.backends.locmem.LocMemCache', ['recipe_api.E001']),
+    ('django.core.cache.backends.redis.RedisCache', []),
+])
+def test_recipe_cache_must_be_shared(backend, errors, settings):
+    settings.CACHES = {'default': {'BACKEND': backend, 'LOCATION': 'redis://localhost:6379'}}
+
+    assert [error.id for error in check_recipe_cache(None)] == errors
+
+
+def test_finalizing_again_returns_processed_image(author, local_storage):
+    name = uploads.get_storage().save('upload.png', ContentFile(b'png'))
+    token = signing.dumps({'name': name, 'user': author.pk}, salt=uploads.TOKEN_SALT)
+    image = uploads.finalize(author, token)
+    image_processing.complete(image, {
+        'medium': {'width': 1, 'height': 1, 'files': {'jpeg': b'jpeg'}},
+    })
+
+    assert uploads.finalize(author, token) == image
+    assert Image.objects.get().status == Image.Status.READY
+
+
+# the hub opens connections of its own, seeing only committed rows
+@pytest.mark.django_db(transaction=True)
+def test_comment_hub_reconnects_once_and_asks_to_resync(monkeypatch):
+    monkeypatch.setattr(streams, 'RECONNECT_DELAY', 0)
+    connect = streams.open_listener
+    attempts = []
+
+    def open_listener(params):
+        attempts.append(params)
+        if len(attempts) == 2:
+            raise streams.psycopg2.OperationalError
+        return connect(params)
+
+    monkeypatch.setattr(streams, 'open_listener', open_listener)
+
+    async def lose_connection():
+        hub = streams.CommentHub()
+        subscription = hub.subscribe(1)
+        await hub.connected()
+        # lost while being read twice in a row
+        hub.reconnect()
+        hub.reconnect()
+        await hub.connected()
+        # closed, and not opened again for nobody
+        hub.unsubscribe(subscription)
+        hub.reconnect()
+        await hub.connected()
+        assert hub.connection is None
+        return [subscription.queue.get_nowait() for _ in range(subscription.queue.qsize())]
+
+    assert async_to_sync(lose_connection)() == [streams.RESYNC]
+    assert len(attempts) == 3
+
+
+class DeletingClient:
+    def delete_objects(self, Bucket, Delete):
+        return {}
+
+
+def test_storage_deletes_are_recorded_with_the_deletion(db, monkeypatch, django_capture_on_commit_callbacks):
+    monkeypatch.setattr(storage_deletes, 's3_client', DeletingClient)
+    kept, deleted = Image.objects.bulk_create([Image(image='kept.jpeg'), Image(image='deleted.jpeg')])
+    with pytest.raises(RuntimeError), transaction.atomic():
+        kept.delete()
+        raise RuntimeError
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        deleted.delete()
+    keys = list(PendingStorageDelete.objects.values_list('key', flat=True))
+    assert keys and all(key.endswith('deleted.jpeg') for key in keys)
+    assert len(callbacks) == 1
+
+    assert storage_deletes.retry(keys) == (len(keys), 0)
+    assert not PendingStorageDelete.objects.exists()
+
+
+@pytest.mark.parametrize('ingredient', ['²', '9' * 20])
+def test_what_can_i_cook_rejects_unknown_ingredient_ids(ingredient, recipe):
+    response = APIClient().get('/api/recipes/what-can-i-cook/', {'ingredients': f'{ingredient},Ingredient 0'})
+
+    assert response.status_code == 400
+    assert response.json()['ingredients'] == [f'Unknown ingredients: {ingredient}']
+
+
+async def asgi_get(application, path, query_string=b'', headers=()):
+    """
+    Sends a GET request to the ASGI application, returns the messages it sent
+    """
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await application({
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'root_path': '',
+        'query_string': query_string,
+        'headers': [(b'host', b'testserver'), *headers],
+        'client': ('127.0.0.1', 50000),
+        'server': ('testserver', 80),
+    }, receive, send)
+    return messages
+
+
+# requests served by the ASGI handler run in threads of their own
+@pytest.mark.django_db(transaction=True)
+def test_export_streams_under_asgi(make_recipes, author):
+    from myproject.asgi import application
+
+    recipes = make_recipes(3)
+    token = AccessToken.for_user(author)
+    messages = async_to_sync(asgi_get)(
+        application, '/api/recipes/export/',
+        headers=[(b'authorization', f'Bearer {token}'.encode())],
+    )
+
+    assert messages[0]['status'] == 200
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    lines = [json.loads(line) for line in body.decode().splitlines()]
+    assert [line['id'] for line in lines] == [recipe.pk for recipe in recipes]
+
+
+def export(client, **params):
+    response = client.get('/api/recipes/export/', params)
+    assert response.status_code == 200
+    return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+
+def test_export_requires_authentication(recipe):
+    assert APIClient().get('/api/recipes/export/').status_code == 401
+
+
+def test_export_is_throttled(recipe, monkeypatch):
+    monkeypatch.setattr(ExportRateThrottle, 'THROTTLE_RATES', {'export': '1/hour'})
+    client = APIClient()
+    client.force_authenticate(recipe.author)
+
+    assert client.get('/api/recipes/export/').status_code == 200
+    assert client.get('/api/recipes/export/').status_code == 429
+
+
+def test_incremental_export_passes_on_changes_and_deletions(make_recipes):
+    kept, changed, withdrawn, deleted = make_recipes(4)
+    client = APIClient()
+    client.force_authenticate(kept.author)
+    since = timezone.now()
+    Recipe.objects.filter(pk=kept.pk).update(time_updated=since - EXPORT_OVERLAP * 2)
+    # committed by a transaction that started before the previous export
+    Recipe.objects.filter(pk=changed.pk).update(time_updated=since - EXPORT_OVERLAP / 2)
+    Recipe.objects.filter(pk=withdrawn.pk).update(status=Recipe.Status.DRAFT, time_updated=since)
+    deleted_pk = deleted.pk
+    deleted.delete()
+
+    lines = export(client, since=(since + timedelta(seconds=1)).isoformat())
+
+    assert lines[0]['id'] == changed.pk
+    assert lines[1:] == [{'id': withdrawn.pk, 'deleted': True}, {'id': deleted_pk, 'deleted': True}]
+
+
+def import_records(path, records):
+    """
+    Runs import_recipes on the given records, JSON lines as they are,
+    returns its output and errors
+    """
+    path.write_text(''.join(
+        (record if isinstance(record, str) else json.dumps(record)) + '\n'
+        for record in records
+    ))
+    out, err = StringIO(), StringIO()
+    call_command('import_recipes', str(path), stdout=out, stderr=err)
+    return out.getvalue(), err.getvalue()
+
+
+def import_record(author, ingredients, main_picture, step_picture=None):
+    return {
+        'name': 'Imported recipe',
+        'author': author.user_name,
+        'category': Recipe.Category.SOUP,
+        'timeCooking': 30,
+        'timePreparing': 10,
+        'servingsNumber': 2,
+        'mainPicture': image_url(main_picture.image.name),
+        'ingredients': [{'ingredient': ingredients[0].name, 'unit': 'g', 'amount': 100}],
+        'steps': [
+            {'text': 'Boil', **({'image': image_url(step_picture.image.name)} if step_picture else {})},
+        ],
+    }
+
+
+def test_import_promotes_main_and_step_pictures(
+        tmp_path, author, ingredients, local_storage, django_capture_on_commit_callbacks):
+    main_picture, step_picture = Image.objects.bulk_create([
+        Image(image='main.jpeg'), Image(image='step.jpeg'),
+    ])
+
+    with django_capture_on_commit_callbacks(execute=True):
+        import_records(tmp_path / 'recipes.jsonl', [
+            import_record(author, ingredients, main_picture, step_picture),
+        ])
+
+    recipe = Recipe.objects.get(name='Imported recipe')
+    assert recipe.main_picture == main_picture
+    for image in (main_picture, step_picture):
+        image.refresh_from_db()
+        assert not image.is_temporary
+        assert image.is_promoted
+
+
+@pytest.mark.parametrize('changes', [
+    {'steps': ['Boil']},
+    {'ingredients': ['salt']},
+    {'mainPicture': 5},
+    {'category': ['Soups']},
+    {'name': 'x' * 101},
+    {'isSpicy': 'false'},
+    {'timeCooking': True},
+    {'timeCooking': 2 ** 40},
+    {'ingredients': [{'ingredient': ['salt'], 'unit': 'g', 'amount': 1}]},
+    {'ingredients': [{'ingredient': 'x' * 101, 'unit': 'g', 'amount': 1}]},
+    {'ingredients': [{'ingredient': 'salt', 'unit': {'g': 1}, 'amount': 1}]},
+    {'ingredients': [{'ingredient': 'salt', 'unit': 'g', 'amount': float('nan')}]},
+    {'ingredients': [{'ingredient': 'salt', 'unit': 'g', 'amount': float('inf')}]},
+    {'steps': [{'text': 'Boil', 'image': 5}]},
+])
+def test_import_rejects_malformed_record(changes, tmp_path, author, ingredients):
+    picture = Image.objects.create(image='picture.jpeg')
+
+    out, err = import_records(tmp_path / 'recipes.jsonl', [
+        {**import_record(author, ingredients, picture), 'name': 'Malformed', **changes},
+        import_record(author, ingredients, picture),
+    ])
+
+    assert err.startswith('Line 1: ')
+    assert 'Imported 1 recipes, rejected 1' in out
+    assert list(Recipe.objects.values_list('name', flat=True)) == ['Imported recipe']
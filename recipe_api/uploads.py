@@ -0,0 +1,87 @@
+"""
+Uploads made by clients straight to the storage.
+
+A client asks for a presigned POST to a new key in the temporary directory,
+sends the file to the storage with it and then finalizes the upload with
+the signed token it got along. Finalizing registers a pending Image for the
+`process_images` workers, so no image content passes through the web app.
+"""
+from datetime import timedelta
+from uuid import uuid4
+
+from django.conf import settings
+from django.core import signing
+
+from .models import Image
+
+TOKEN_SALT = 'recipe_api.uploads'
+# files are not finalized long after their upload, temporary images
+# expire after a day anyway
+TOKEN_MAX_AGE = timedelta(days=1)
+# content type of an upload and the extension of its file
+CONTENT_TYPES = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+}
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class NotUploaded(Exception):
+    pass
+
+
+def get_storage():
+    return Image._meta.get_field('image').storage
+
+
+def presign(user, content_type):
+    """
+    Returns the URL and form fields of a POST uploading a file of the given
+    type to a new key, and the token finalizing the upload
+    """
+    storage = get_storage()
+    name = f'{uuid4()}.{CONTENT_TYPES[content_type]}'
+    post = storage.connection.meta.client.generate_presigned_post(
+        Bucket=storage.bucket_name,
+        Key=storage.location + name,
+        Fields={'Content-Type': content_type},
+        Conditions=[
+            {'Content-Type': content_type},
+            ['content-length-range', 1, settings.IMAGE_UPLOAD_MAX_SIZE],
+        ],
+        ExpiresIn=settings.IMAGE_UPLOAD_URL_EXPIRES,
+    )
+    return {
+        'url': post['url'],
+        'fields': post['fields'],
+        'token': signing.dumps({'name': name, 'user': user.pk}, salt=TOKEN_SALT),
+    }
+
+
+def finalize(user, token):
+    """
+    Registers the file uploaded with the token as an image queued for
+    processing. Finalizing the same upload again returns the same image.
+    """
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT, max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        raise InvalidToken
+    if data['user'] != user.pk:
+        raise InvalidToken
+
+    # the file is renamed once processed, the upload is looked up by its key
+    image = Image.objects.filter(upload_name=data['name']).first()
+    if image is not None:
+        return image
+    if not get_storage().exists(data['name']):
+        raise NotUploaded
+    # concurrent finalizations of the upload create a single image
+    image, _ = Image.objects.get_or_create(
+        upload_name=data['name'],
+        defaults={'image': data['name'], 'status': Image.Status.PENDING},
+    )
+    return image
@@ -1,16 +1,20 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import SimpleRouter
 
+from .async_views import AsyncReadRouter
 from .views import CommentsViewSet, ImageViewSet, RecipeViewSet
 
 app_name = 'recipe_api'
 
+read_router_class = AsyncReadRouter if settings.ASYNC_READ_VIEWS else SimpleRouter
+
 # router for recipes
-recipe_router = SimpleRouter()
+recipe_router = read_router_class()
 recipe_router.register(r'recipes', RecipeViewSet, basename='recipes')
 
 # router for comments
-comment_router = SimpleRouter()
+comment_router = read_router_class()
 comment_router.register(r'feedbacks', CommentsViewSet, basename='feedbacks')
 
 # router for pictures
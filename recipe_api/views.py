@@ -1,16 +1,36 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework import mixins, viewsets
+from djangorestframework_camel_case.parser import CamelCaseJSONParser
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.parsers import FormParser, MultiPartParser
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.permissions import (IsAdminUser, IsAuthenticated,
+                                        IsAuthenticatedOrReadOnly)
+from rest_framework.response import Response
+from rest_framework.throttling import UserRateThrottle
 
-from utils.image_converter import JpegConverter
+from utils.image_converter import RenditionConverter
 
-from .models import Comment, Image, Recipe
-from .pagination import CustomPagination
+from . import cache as recipe_cache
+from . import image_processing, uploads
+from .async_views import AsyncReadMixin
+from .export import iter_ndjson
+from .filters import RecipeFilter
+from .models import Comment, Image, Recipe, RecipeSummary
+from .pagination import CustomPagination, KeysetPagination
 from .permissions import IsOwnerOrReadOnly
-from .serializers import (CommentSerializer, ImagePostSerializer,
+from .search import cookable_recipes, search_recipes
+from .serializers import (CommentSerializer, CookableQuerySerializer,
+                          CookableRecipeSerializer, FinalizeUploadSerializer,
+                          ImagePostSerializer, ImageStatusSerializer,
+                          PresignedUploadSerializer, PresignRequestSerializer,
                           RecipeDetailedSerializer, RecipeListSerializer)
 
 comment_text_param = openapi.Parameter(
@@ -20,48 +40,343 @@ comment_text_param = openapi.Parameter(
 )
 user_response = openapi.Response('response description', CommentSerializer)
 list_response = openapi.Response('resp', RecipeDetailedSerializer)
+search_param = openapi.Parameter(
+    'search',
+    openapi.IN_QUERY,
+    description='Full-text search over recipe names, ingredients and steps',
+    type=openapi.TYPE_STRING
+)
+filter_params = [
+    openapi.Parameter(
+        'category',
+        openapi.IN_QUERY,
+        description='Comma separated categories',
+        type=openapi.TYPE_STRING
+    ),
+    openapi.Parameter('is_spicy', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN),
+    openapi.Parameter('is_vegetarian', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN),
+    openapi.Parameter(
+        'time_min',
+        openapi.IN_QUERY,
+        description='Min total time (cooking + preparing), minutes',
+        type=openapi.TYPE_INTEGER
+    ),
+    openapi.Parameter(
+        'time_max',
+        openapi.IN_QUERY,
+        description='Max total time (cooking + preparing), minutes',
+        type=openapi.TYPE_INTEGER
+    ),
+    openapi.Parameter(
+        'facets',
+        openapi.IN_QUERY,
+        description='Add the number of recipes per filter value to the response',
+        type=openapi.TYPE_BOOLEAN
+    ),
+]
+
+
+class ExportRateThrottle(UserRateThrottle):
+    scope = 'export'
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+since_param = openapi.Parameter(
+    'since',
+    openapi.IN_QUERY,
+    description='Export only recipes changed after this ISO 8601 timestamp',
+    type=openapi.TYPE_STRING,
+    format=openapi.FORMAT_DATETIME
+)
+ingredients_param = openapi.Parameter(
+    'ingredients',
+    openapi.IN_QUERY,
+    description='Comma separated ingredient ids or names',
+    type=openapi.TYPE_STRING,
+    required=True
+)
+min_coverage_param = openapi.Parameter(
+    'min_coverage',
+    openapi.IN_QUERY,
+    description='Min share of recipe ingredients to have, from 0.01 to 1 (default)',
+    type=openapi.TYPE_NUMBER
+)
+
+
+class RecipeViewSet(AsyncReadMixin, viewsets.ModelViewSet):
     """
     ViewSet for listing, retrieving, updating and creating recipes
     """
-    queryset = (Recipe.objects
-                .select_related('author')
-                .prefetch_related('ingredients__ingredient', 'steps__image')
-                .filter(status=Recipe.Status.PUBLISHED)
-                )
+    queryset = Recipe.objects.filter(status=Recipe.Status.PUBLISHED)
+
+    # only the columns RecipeListSerializer renders (+ the pagination keys)
+    list_fields = (
+        'id',
+        'name',
+        'author',
+        'author__user_name',
+        'category',
+        'is_spicy',
+        'is_vegetarian',
+        'servings_number',
+        'time_created',
+        'main_picture',
+        'main_picture__image',
+        'main_picture__renditions',
+        'main_picture__is_promoted',
+        'summary__ingredients_count',
+        'summary__steps_count',
+        'summary__comments_count',
+        'summary__total_time',
+    )
+
+    # max number of SQL queries per action, pinned by recipe_api/tests.py
+    query_budgets = {
+        'list': 2,  # page + total count on a cold cache (+1 with facets)
+        'retrieve': 3,  # recipe + ingredients + steps
+    }
 
-    pagination_class = CustomPagination
+    pagination_class = KeysetPagination
     http_method_names = ['get', 'post', 'head', 'put', 'delete']
+    lookup_value_regex = '[0-9]+'
+    async_actions = ('list', 'retrieve')
     permission_classes = (IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly, )
 
+    @property
+    def search_text(self):
+        return self.request.query_params.get('search', '').strip()
+
+    @property
+    def paginator(self):
+        """
+        Search results are ranked, not ordered by time, so they are paged by number
+        """
+        if not hasattr(self, '_paginator'):
+            if self.action == 'what_can_i_cook' or (self.action == 'list' and self.search_text):
+                self._paginator = CustomPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        """
+        Picks the query plan for the current action
+        """
+        queryset = super().get_queryset()
+
+        if self.action in ('list', 'what_can_i_cook'):
+            queryset = (queryset
+                        .select_related('author', 'main_picture', 'summary')
+                        .only(*self.list_fields)
+                        )
+            if self.action == 'list' and self.search_text:
+                queryset = search_recipes(queryset, self.search_text)
+            return queryset
+
+        if self.action in ('retrieve', 'update'):
+            return RecipeDetailedSerializer.setup_eager_loading(queryset)
+
+        return queryset
+
+    def filter_queryset(self, queryset):
+        """
+        Applies the filters of the list on top of the query plan
+        """
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'list':
+            queryset = self.recipe_filter.filter(queryset)
+        return queryset
+
     def get_serializer_class(self, *args, **kwargs):
         if self.action == 'list':
             return RecipeListSerializer
+        elif self.action == 'what_can_i_cook':
+            return CookableRecipeSerializer
         else:
             return RecipeDetailedSerializer
 
+    @swagger_auto_schema(manual_parameters=[search_param, *filter_params])
+    def list(self, request, *args, **kwargs):
+        url = request.build_absolute_uri()
+        data = recipe_cache.get_list(url)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        self.recipe_filter = RecipeFilter(request.query_params)
+        response = super().list(request, *args, **kwargs)
+        if self.recipe_filter.with_facets:
+            response.data['facets'] = self.recipe_filter.facets(self.get_queryset())
+        recipe_cache.set_list(url, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    async def alist(self, request, *args, **kwargs):
+        if self.search_text:
+            # ranked results are paged by number, by the synchronous list
+            return await sync_to_async(self.list)(request, *args, **kwargs)
+
+        url = request.build_absolute_uri()
+        data = await sync_to_async(recipe_cache.get_list)(url)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        self.recipe_filter = RecipeFilter(request.query_params)
+        page = await self.paginator.apaginate_queryset(
+            self.filter_queryset(self.get_queryset()), request, view=self
+        )
+        response = await self.paginator.aget_paginated_response(
+            self.get_serializer(page, many=True).data
+        )
+        if self.recipe_filter.with_facets:
+            response.data['facets'] = await self.recipe_filter.afacets(self.get_queryset())
+        await sync_to_async(recipe_cache.set_list)(url, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
 
-class CommentsViewSet(mixins.ListModelMixin,
+    def retrieve(self, request, *args, **kwargs):
+        # cached under the id the recipe is invalidated by, not as written in the URL
+        pk = int(kwargs['pk'])
+        data = recipe_cache.get_detail(pk)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        response = super().retrieve(request, *args, **kwargs)
+        recipe_cache.set_detail(pk, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    async def aretrieve(self, request, *args, **kwargs):
+        pk = int(kwargs['pk'])
+        data = await sync_to_async(recipe_cache.get_detail)(pk)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        data = self.get_serializer(await self.aget_object()).data
+        await sync_to_async(recipe_cache.set_detail)(pk, data)
+        return Response(data, headers={'X-Cache': 'MISS'})
+
+    @swagger_auto_schema(manual_parameters=[ingredients_param, min_coverage_param])
+    @action(detail=False, url_path='what-can-i-cook')
+    def what_can_i_cook(self, request):
+        """
+        Lists recipes that can be cooked from the given ingredients,
+        the best covered first
+        """
+        values = [
+            value.strip()
+            for param in request.query_params.getlist('ingredients')
+            for value in param.split(',')
+            if value.strip()
+        ]
+        query = CookableQuerySerializer(data={
+            'ingredients': values,
+            'min_coverage': request.query_params.get('min_coverage', 1),
+        })
+        query.is_valid(raise_exception=True)
+
+        queryset = cookable_recipes(
+            self.get_queryset(),
+            query.validated_data['ingredients'],
+            query.validated_data['min_coverage'],
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @swagger_auto_schema(manual_parameters=[since_param])
+    @action(detail=False, permission_classes=(IsAuthenticated, ),
+            throttle_classes=(ExportRateThrottle, ))
+    def export(self, request):
+        """
+        Streams all published recipes as NDJSON, one recipe per line.
+        Only for authenticated users, a few times an hour (EXPORT_THROTTLE_RATE)
+        """
+        since = request.query_params.get('since')
+        if since is not None:
+            since = parse_datetime(since)
+            if since is None:
+                raise ValidationError({'since': 'Expected an ISO 8601 timestamp.'})
+
+        return StreamingHttpResponse(
+            iter_ndjson(since),
+            content_type='application/x-ndjson',
+        )
+
+    @action(detail=False, url_path='cache-stats', permission_classes=(IsAdminUser, ))
+    def cache_stats(self, request):
+        """
+        Hit/miss counters of the recipe payload cache
+        """
+        return Response(recipe_cache.stats())
+
+
+class CommentsViewSet(AsyncReadMixin,
+                      mixins.ListModelMixin,
                       mixins.CreateModelMixin,
                       viewsets.GenericViewSet):
     """
     ViewSet for listing and creating comments on certain recipe
     """
-    pagination_class = CustomPagination
+    pagination_class = KeysetPagination
     serializer_class = CommentSerializer
     permission_classes = (IsAuthenticatedOrReadOnly, )
+    async_actions = ('list', )
+
+    query_budgets = {
+        'list': 2,  # recipe lookup with its counters + page
+        'create': 2,  # recipe lookup + insert
+    }
+
+    def get_recipe(self):
+        """
+        Looks the recipe up once per request, along with its comment counter
+        """
+        if not hasattr(self, '_recipe'):
+            self._recipe = get_object_or_404(self.recipes(), pk=self.kwargs['pk'])
+        return self._recipe
+
+    async def aget_recipe(self):
+        if not hasattr(self, '_recipe'):
+            try:
+                self._recipe = await self.recipes().aget(pk=self.kwargs['pk'])
+            except Recipe.DoesNotExist:
+                raise Http404
+        return self._recipe
+
+    @staticmethod
+    def recipes():
+        return Recipe.objects.select_related('summary').only('id', 'summary__comments_count')
 
     def get_queryset(self):
-        recipe = get_object_or_404(Recipe, pk=self.kwargs['pk'])
-        return Comment.objects.filter(recipe=recipe).select_related('user')
+        if getattr(self, 'swagger_fake_view', False):
+            return Comment.objects.none()
+        # ordered by the pagination along comment_recipe_created_idx
+        return Comment.objects.filter(recipe=self.get_recipe()).select_related('user')
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
-        context.update({"recipe_pk": self.kwargs['pk']})
+        if not getattr(self, 'swagger_fake_view', False):
+            context.update({"recipe": self.get_recipe()})
         return context
 
+    def pagination_total(self):
+        """
+        Number of comments from the counter kept by triggers (see
+        migration 0016) instead of COUNT(*)
+        """
+        try:
+            return self.get_recipe().summary.comments_count
+        except RecipeSummary.DoesNotExist:
+            return None
+
+    async def alist(self, request, *args, **kwargs):
+        await self.aget_recipe()
+        page = await self.paginator.apaginate_queryset(
+            self.filter_queryset(self.get_queryset()), request, view=self
+        )
+        return await self.paginator.aget_paginated_response(
+            self.get_serializer(page, many=True).data
+        )
+
     @swagger_auto_schema(
         operation_description="Create comment on certain recipe",
         request_body=openapi.Schema(
@@ -82,18 +397,90 @@ class CommentsViewSet(mixins.ListModelMixin,
         return super().create(request, *args, **kwargs)
 
 
-class ImageViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
+class ImageViewSet(mixins.CreateModelMixin,
+                   mixins.RetrieveModelMixin,
+                   viewsets.GenericViewSet):
     """
-    Viewset for uploading pictures
+    Viewset for uploading pictures and polling their processing status
     """
     queryset = Image.objects.all()
-    serializer_class = ImagePostSerializer
     parser_classes = (MultiPartParser, FormParser)
 
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return ImageStatusSerializer
+        return ImagePostSerializer
+
+    @swagger_auto_schema(responses={201: ImagePostSerializer, 202: ImageStatusSerializer})
+    def create(self, request, *args, **kwargs):
+        """
+        Converts the picture right away, or with IMAGE_PROCESSING_ASYNC
+        stores it as is and queues it for a `process_images` worker
+        """
+        if not settings.IMAGE_PROCESSING_ASYNC:
+            return super().create(request, *args, **kwargs)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        image = serializer.save(status=Image.Status.PENDING)
+        return self.accepted(image)
+
+    @swagger_auto_schema(request_body=PresignRequestSerializer,
+                         responses={200: PresignedUploadSerializer})
+    @action(detail=False, methods=['post'], parser_classes=(CamelCaseJSONParser, ))
+    def presign(self, request):
+        """
+        Presigned POST for uploading a picture straight to the storage,
+        to be finalized afterwards
+        """
+        serializer = PresignRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = uploads.presign(request.user, serializer.validated_data['content_type'])
+        return Response(PresignedUploadSerializer(upload).data)
+
+    @swagger_auto_schema(request_body=FinalizeUploadSerializer,
+                         responses={202: ImageStatusSerializer})
+    @action(detail=False, methods=['post'], parser_classes=(CamelCaseJSONParser, ))
+    def finalize(self, request):
+        """
+        Registers a picture uploaded with a presigned POST and queues it for
+        a `process_images` worker
+        """
+        serializer = FinalizeUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            image = uploads.finalize(request.user, serializer.validated_data['token'])
+        except uploads.InvalidToken:
+            raise ValidationError({'token': ['Invalid or expired token.']})
+        except uploads.NotUploaded:
+            raise ValidationError({'token': ['The file has not been uploaded.']})
+        return self.accepted(image)
+
+    def accepted(self, image):
+        return Response(
+            ImageStatusSerializer(image).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': reverse('recipe_api:upload-image-detail', args=[image.pk])},
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Processing status of an uploaded picture, with its URL once it is ready
+        """
+        return super().retrieve(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         validated_image = serializer.validated_data['image']
 
-        # Convert image to JPEG format
-        converted_image = JpegConverter.convert(validated_image)
+        # Scale the image (opened by the validation) to every rendition
+        try:
+            renditions = RenditionConverter.convert(
+                validated_image.image,
+                webp=settings.IMAGE_RENDITIONS_WEBP,
+            )
+        except (OSError, SyntaxError):
+            # the header was fine, but the image data is not
+            raise ValidationError({'image': ['Invalid image file.']})
+        main, record = image_processing.store(renditions)
 
-        serializer.save(image=converted_image)
\ No newline at end of file
+        serializer.save(image=main, renditions=record)